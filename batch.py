@@ -0,0 +1,179 @@
+import numpy as np
+
+from engine import GRID_WIDTH, GRID_HEIGHT, RADIUS_AI_VISION
+from headless import MAX_TICKS
+
+EMPTY = 0
+WALL = 255
+
+# N games of two players stepped together, same rules as engine.TronGame
+# occupancy holds the owner id of every trail cell like board.Board
+
+
+class BatchTronGame:
+    def __init__( self, n, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None, random_start=False, max_ticks=MAX_TICKS ):
+        self.n = n
+        self.max_ticks = max_ticks
+        self.width = width
+        self.height = height
+        self.random_start = random_start
+        # the board is stored with a wall border wider than the bot vision so window queries never clip
+        # even around the moves that leave the board
+        self.pad = RADIUS_AI_VISION + 1
+        self.padded = np.full( (n, height + 2 * self.pad, width + 2 * self.pad), WALL, dtype=np.uint8 )
+        self.occupancy = self.padded[:, self.pad:self.pad + height, self.pad:self.pad + width]
+        offsets = np.arange( -RADIUS_AI_VISION, RADIUS_AI_VISION + 1 )
+        self.window_y = offsets[:, None]
+        self.window_x = offsets[None, :]
+        # heads[game, player] = (x, y), directions[game, player] = (dx, dy)
+        self.heads = np.zeros( (n, 2, 2), dtype=np.int32 )
+        self.directions = np.zeros( (n, 2, 2), dtype=np.int32 )
+        self.alive = np.ones( (n, 2), dtype=bool )
+        self.ticks = np.zeros( n, dtype=np.int32 )
+        # -1 while the match runs, then 0 for an egality or the number of the winner
+        self.result = np.full( n, -1, dtype=np.int8 )
+        self.reset( seed )
+
+    def reset( self, seed=None ):
+        self.rng = np.random.default_rng( seed )
+        self.occupancy[:] = EMPTY
+        self.alive[:] = True
+        self.ticks[:] = 0
+        self.result[:] = -1
+
+        if self.random_start:
+            # mirrored start so neither side gets an advantage
+            x = self.rng.integers( 1, self.width // 2 - 1, self.n )
+            y = self.rng.integers( 1, self.height - 1, self.n )
+            starts = np.array( [[1, 0], [0, 1], [0, -1]], dtype=np.int32 )
+            direction = starts[self.rng.integers( 0, 3, self.n )]
+            self.heads[:, 0, 0] = x
+            self.heads[:, 0, 1] = y
+            self.heads[:, 1, 0] = self.width - 1 - x
+            self.heads[:, 1, 1] = y
+            self.directions[:, 0] = direction
+            self.directions[:, 1, 0] = -direction[:, 0]
+            self.directions[:, 1, 1] = direction[:, 1]
+        else:
+            self.heads[:, 0] = ( self.width * 3 // 16, self.height // 2 )
+            self.heads[:, 1] = ( self.width - self.width * 3 // 16, self.height // 2 )
+            self.directions[:, 0] = ( 1, 0 )
+            self.directions[:, 1] = ( -1, 0 )
+
+    def running( self ):
+        return self.result < 0
+
+    def candidates( self, games, player ):
+        # (len(games), 3, 2) directions a player may take: straight, left, right
+        dx = self.directions[games, player, 0]
+        dy = self.directions[games, player, 1]
+        return np.stack( [
+            np.stack( [dx, dy], axis=1 ),
+            np.stack( [-dy, dx], axis=1 ),
+            np.stack( [dy, -dx], axis=1 )
+        ], axis=1 )
+
+    def isFree( self, games, cells ):
+        # cells (len(games), k, 2) -> (len(games), k) inside the board and not on a trail
+        # cells are at most one step outside the board so they always land on the wall border
+        return self.padded[games[:, None], cells[..., 1] + self.pad, cells[..., 0] + self.pad] == 0
+
+    def blockedCells( self, games, player ):
+        # the other player's head and the cell it is about to enter, not written on the board yet
+        other = 1 - player
+        head = self.heads[games, other]
+        return np.stack( [head, head + self.directions[games, other]], axis=1 )
+
+    def validMoves( self, games, player ):
+        moves = self.candidates( games, player )
+        cells = self.heads[games, player][:, None] + moves
+        blocked = self.blockedCells( games, player )
+        valid = self.isFree( games, cells )
+        for i in range( blocked.shape[1] ):
+            valid &= ~np.all( cells == blocked[:, i][:, None], axis=2 )
+        return moves, cells, valid
+
+    def randomActions( self, games, player ):
+        # difficulty 1, uniform choice among the free moves
+        moves, cells, valid = self.validMoves( games, player )
+        keys = np.where( valid, self.rng.random( valid.shape ), -1.0 )
+        choice = np.argmax( keys, axis=1 )
+        actions = moves[np.arange( len( games ) ), choice]
+        return np.where( valid.any( axis=1 )[:, None], actions, self.directions[games, player] )
+
+    def freeSpace( self, games, cells, player ):
+        # same score as fast_space in engine.Player.updateBot for every cell of (len(games), k, 2)
+        radius = RADIUS_AI_VISION
+        x = cells[..., 0]
+        y = cells[..., 1]
+        # the wall border counts as occupied, so the window is read without any clipping
+        window = self.padded[
+            games[:, None, None, None],
+            ( y + self.pad )[..., None, None] + self.window_y,
+            ( x + self.pad )[..., None, None] + self.window_x
+        ]
+        score = np.count_nonzero( window == 0, axis=( 2, 3 ) )
+
+        blocked = self.blockedCells( games, player )
+        blocked_free = self.isFree( games, blocked )
+        for i in range( blocked.shape[1] ):
+            bx = blocked[:, i, 0][:, None]
+            by = blocked[:, i, 1][:, None]
+            seen = ( np.abs( bx - x ) <= radius ) & ( np.abs( by - y ) <= radius ) & blocked_free[:, i][:, None]
+            score = score - seen
+        return score
+
+    def greedyActions( self, games, player ):
+        # difficulty 2, the free move with the most free cells around it
+        moves, cells, valid = self.validMoves( games, player )
+        score = np.where( valid, self.freeSpace( games, cells, player ), -1 )
+        choice = np.argmax( score, axis=1 )
+        actions = moves[np.arange( len( games ) ), choice]
+        return np.where( valid.any( axis=1 )[:, None], actions, self.directions[games, player] )
+
+    def botActions( self, difficulties ):
+        # players think one after the other like in the game loop, finished games keep their direction
+        actions = self.directions.copy()
+        games = np.nonzero( self.running() )[0]
+        for player, difficulty in enumerate( difficulties ):
+            if difficulty == 1:
+                actions[games, player] = self.randomActions( games, player )
+            elif difficulty == 2:
+                actions[games, player] = self.greedyActions( games, player )
+            else:
+                raise ValueError( f"difficulty {difficulty} has no batched version" )
+            self.directions[games, player] = actions[games, player]
+        return actions
+
+    def step( self, actions=None ):
+        running = self.running()
+        games = np.nonzero( running )[0]
+        if len( games ) == 0:
+            return self.result
+
+        if actions is not None:
+            actions = np.asarray( actions, dtype=np.int32 )[games]
+            current = self.directions[games]
+            # a player can never go back on its own trail
+            keep = np.all( actions == -current, axis=2, keepdims=True )
+            self.directions[games] = np.where( keep, current, actions )
+
+        heads = self.heads[games]
+        for player in range( 2 ):
+            self.occupancy[games, heads[:, player, 1], heads[:, player, 0]] = player + 1
+        heads = heads + self.directions[games]
+        self.heads[games] = heads
+
+        head_on = np.all( heads[:, 0] == heads[:, 1], axis=1 )[:, None]
+        alive = self.isFree( games, heads ) & ~head_on
+        self.alive[games] = alive
+        self.ticks[games] += 1
+
+        result = np.full( len( games ), -1, dtype=np.int8 )
+        result[~alive[:, 0] & ~alive[:, 1]] = 0
+        result[alive[:, 0] & ~alive[:, 1]] = 1
+        result[~alive[:, 0] & alive[:, 1]] = 2
+        # matches where both bots keep circling forever end in an egality
+        result[( result < 0 ) & ( self.ticks[games] >= self.max_ticks )] = 0
+        self.result[games] = result
+        return self.result
@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import random
+import sys
+from time import perf_counter
+
+from board import Board
+from engine import TronGame, DIRECTIONS
+from endgame import SpaceFiller
+from headless import runMatches
+
+# performance benchmarks, python bench.py --baseline bench_baseline.json fails when a number got worse
+# every fixture is built from a fixed seed so two runs measure the same work
+
+DIFFICULTIES = [1, 2, 3, 4, 5, 6]
+TRAIL_LENGTHS = [100, 1000, 5000]
+ARENA_SIZES = [8, 16]
+# walled in regions filled by the endgame of the bots and by a plain flood fill, for the same positions
+ENDGAME_REGIONS = 30
+DEFAULT_BASELINE = "bench_baseline.json"
+# allowed slowdown before a metric counts as a regression
+TOLERANCE = 0.25
+# a bot decision has to fit in one tick at the default tick rate of the game (30 ticks a second), a
+# lockstep bot that takes longer holds the tick and slows the whole game down
+TICK_MS = 1000 / 30
+
+
+def emptyFixture():
+    game = TronGame()
+    game.reset( 1 )
+    return game
+
+
+def isolated( game ):
+    # the first player can no longer reach the second one
+    board = game.board
+    return SpaceFiller( board.width, board.height ).isolated( board, game.players[0].getPos(), [ game.players[1].getPos() ] )
+
+
+def midGameFixture( ticks=150 ):
+    # a real match between two greedy bots, stopped halfway while both can still reach each other
+    # (a partitioned player only runs the endgame filler, the search would not be measured)
+    game = TronGame( random_start=True )
+    game.reset( 7 )
+    while game.result is None and game.tick < ticks:
+        game.step( [ game.think( 0, 2 ), game.think( 1, 2 ) ] )
+    if game.result is not None:
+        raise RuntimeError( "mid-game fixture ended early" )
+    if isolated( game ):
+        raise RuntimeError( "mid-game fixture is already partitioned" )
+    return game
+
+
+def endgameFixture():
+    # the same match played on until the players are walled off from each other, from difficulty 3
+    # the bots only fill their region there
+    game = TronGame( random_start=True )
+    game.reset( 7 )
+    while not isolated( game ):
+        game.step( [ game.think( 0, 2 ), game.think( 1, 2 ) ] )
+        if game.result is not None:
+            raise RuntimeError( "endgame fixture ended before the players were partitioned" )
+    return game
+
+
+def crowdedFixture( fill=0.4 ):
+    # random walls everywhere except a small room around both heads
+    game = TronGame()
+    game.reset( 3 )
+    rng = random.Random( 3 )
+    board = game.board
+    heads = [ player.getPos() for player in game.players ]
+    for y in range( board.height ):
+        for x in range( board.width ):
+            if rng.random() < fill and all( abs( x - hx ) + abs( y - hy ) > 3 for hx, hy in heads ):
+                board.set( x, y, 3 )
+    return game
+
+
+FIXTURES = {
+    "empty": emptyFixture,
+    "mid-game": midGameFixture,
+    "endgame": endgameFixture,
+    "crowded": crowdedFixture
+}
+
+
+def percentile( values, p ):
+    values = sorted( values )
+    return values[min( len( values ) - 1, int( len( values ) * p ) )]
+
+
+def benchDecisions( repeats ):
+    results = {}
+    for name, fixture in FIXTURES.items():
+        for difficulty in DIFFICULTIES:
+            # a new fixture for every difficulty, what a bot learns about the position (the partition
+            # check latches on the player) must not carry over to the next one
+            game = fixture()
+            player, other = game.players
+            direction = list( player.direction )
+            times = []
+            for _ in range( repeats ):
+                player.direction = list( direction )
+                start = perf_counter()
+                player.updateBot( difficulty, game.board, [other], 0 )
+                times.append( perf_counter() - start )
+            results[f"decision.{name}.difficulty{difficulty}.p50"] = ( percentile( times, 0.5 ) * 1000, "ms", "lower" )
+            results[f"decision.{name}.difficulty{difficulty}.p95"] = ( percentile( times, 0.95 ) * 1000, "ms", "lower" )
+    return results
+
+
+def regionFixture( rng ):
+    # small board of scattered walls and a few random walks, the head anywhere free in it
+    board = Board( rng.randrange( 12, 36 ), rng.randrange( 10, 28 ) )
+    density = rng.choice( ( 0.05, 0.1, 0.2, 0.3 ) )
+    for y in range( board.height ):
+        for x in range( board.width ):
+            if rng.random() < density:
+                board.set( x, y, 3 )
+    for _ in range( rng.randrange( 2, 6 ) ):
+        x, y = rng.randrange( board.width ), rng.randrange( board.height )
+        for _ in range( rng.randrange( 20, 80 ) ):
+            if board.isInside( x, y ):
+                board.set( x, y, 2 )
+            dx, dy = rng.choice( DIRECTIONS )
+            x += dx
+            y += dy
+    while True:
+        head = ( rng.randrange( board.width ), rng.randrange( board.height ) )
+        if board.isFree( *head ):
+            return board, head, rng.choice( DIRECTIONS )
+
+
+def floodFillMove( board, head, direction ):
+    # reference for the endgame: the move reaching the most cells, then the one along the most walls
+    x, y = head
+    dx, dy = direction
+    moves = [ d for d in ( (dx, dy), (-dy, dx), (dy, -dx) ) if board.isFree( x + d[0], y + d[1] ) ]
+    if not moves:
+        return None
+    start = board.index( x, y )
+    board.cells[start] = 255
+
+    def score( d ):
+        first = ( x + d[0], y + d[1] )
+        seen = { first }
+        stack = [ first ]
+        while stack:
+            cx, cy = stack.pop()
+            for ex, ey in DIRECTIONS:
+                cell = ( cx + ex, cy + ey )
+                if cell not in seen and board.isFree( *cell ):
+                    seen.add( cell )
+                    stack.append( cell )
+        return len( seen ), -sum( 1 for ex, ey in DIRECTIONS if board.isFree( first[0] + ex, first[1] + ey ) )
+
+    best = max( moves, key=score )
+    board.cells[start] = 0
+    return best
+
+
+def fillRegion( board, head, direction, choose, times=None ):
+    # cells filled before the head is stuck
+    board = board.copy()
+    filled = 0
+    while True:
+        start = perf_counter()
+        move = choose( board, head, direction )
+        if times is not None:
+            times.append( perf_counter() - start )
+        if move is None:
+            return filled
+        board.set( head[0], head[1], 1 )
+        head = ( head[0] + move[0], head[1] + move[1] )
+        direction = move
+        filled += 1
+        if not board.isFree( *head ):
+            return filled
+
+
+def benchEndgame( regions ):
+    rng = random.Random( 13 )
+    filler_cells = 0
+    flood_cells = 0
+    better = 0
+    times = []
+    for _ in range( regions ):
+        board, head, direction = regionFixture( rng )
+        filler = SpaceFiller( board.width, board.height )
+        filled = fillRegion( board, head, direction, filler.bestMove, times )
+        flooded = fillRegion( board, head, direction, floodFillMove )
+        filler_cells += filled
+        flood_cells += flooded
+        better += filled > flooded
+    return {
+        # above 1 when the endgame fills more than the flood fill would
+        "endgame.filled_vs_flood_fill": ( filler_cells / max( flood_cells, 1 ), "x", "higher" ),
+        "endgame.regions_filled_better": ( better / regions * 100, "%", "higher" ),
+        "endgame.move.p50": ( percentile( times, 0.5 ) * 1000, "ms", "lower" ),
+        "endgame.move.p95": ( percentile( times, 0.95 ) * 1000, "ms", "lower" )
+    }
+
+
+def benchCollisions( repeats ):
+    results = {}
+    for length in TRAIL_LENGTHS:
+        game = TronGame()
+        game.reset( 1 )
+        player, other = game.players
+        # walk a snake across the board to get a trail of the wanted length
+        board = game.board
+        x, y = 0, 0
+        step = 1
+        for _ in range( length ):
+            player.x, player.y = x, y
+            player.update( board )
+            x += step
+            if x < 0 or x >= board.width:
+                step = -step
+                x += step
+                y += 1
+        player.x, player.y = board.width // 2, board.height - 1
+        heads = { player.getPos(): 1, other.getPos(): 1 }
+        start = perf_counter()
+        for _ in range( repeats ):
+            player.isAlive( board, heads )
+        results[f"collision.trail{length}"] = ( ( perf_counter() - start ) / repeats * 1e6, "us", "lower" )
+    return results
+
+
+def benchHeadless( games ):
+    results = {}
+    for p1, p2 in ( (1, 2), (2, 2) ):
+        _, ticks, elapsed = runMatches( [p1, p2], games, seed=11, random_start=True )
+        results[f"headless.bot{p1}_vs_bot{p2}.ticks_per_sec"] = ( ticks / max( elapsed, 1e-9 ), "ticks/s", "higher" )
+    for count in ARENA_SIZES:
+        _, ticks, elapsed = runMatches( [2] * count, games, seed=11, random_start=True )
+        results[f"headless.arena{count}.ticks_per_sec"] = ( ticks / max( elapsed, 1e-9 ), "ticks/s", "higher" )
+    return results
+
+
+def benchRender( frames ):
+    os.environ.setdefault( "SDL_VIDEODRIVER", "dummy" )
+    try:
+        import pygame
+    except ImportError:
+        return {}
+    from render import TrailRenderer, ViewportRenderer, Camera, SURFARRAY
+
+    pygame.init()
+    screen = pygame.display.set_mode( (800, 600) )
+    renderer = TrailRenderer( screen, 5, (0, 0, 0) )
+    game = TronGame( random_start=True )
+    game.reset( 5 )
+    colors = [ (0, 255, 0), (255, 0, 0) ]
+    times = []
+    while game.result is None and len( times ) < frames:
+        game.step( [ game.think( 0, 2 ), game.think( 1, 2 ) ] )
+        start = perf_counter()
+        renderer.render( list( zip( game.players, colors ) ), "running" )
+        times.append( perf_counter() - start )
+    start = perf_counter()
+    renderer.reset()
+    renderer.render( list( zip( game.players, colors ) ), "running" )
+    full = perf_counter() - start
+    results = {
+        "render.frame.p50": ( percentile( times, 0.5 ) * 1000, "ms", "lower" ),
+        "render.frame.p95": ( percentile( times, 0.95 ) * 1000, "ms", "lower" ),
+        "render.full_redraw": ( full * 1000, "ms", "lower" )
+    }
+
+    if SURFARRAY:
+        # the whole of the largest arena, then following a player, both redrawn every frame
+        game = TronGame( 2000, 2000 )
+        game.board.cells[::7] = bytes( [1] ) * len( game.board.cells[::7] )
+        camera = Camera( 2000, 2000, 800, 600 )
+        renderer = ViewportRenderer( screen, game.board, camera, (0, 0, 0) )
+        players = list( zip( game.players, colors ) )
+        for name in ( "overview", "follow" ):
+            times = []
+            for _ in range( frames // 10 ):
+                renderer.reset()
+                start = perf_counter()
+                renderer.render( players )
+                times.append( perf_counter() - start )
+            results[f"render.viewport2000.{name}.p50"] = ( percentile( times, 0.5 ) * 1000, "ms", "lower" )
+            camera.cycle( len( players ) )
+    pygame.quit()
+    return results
+
+
+def runBenchmarks( quick=False ):
+    scale = 1 if quick else 5
+    metrics = {}
+    metrics.update( benchDecisions( 4 * scale ) )
+    metrics.update( benchEndgame( ENDGAME_REGIONS * scale ) )
+    metrics.update( benchCollisions( 20000 * scale ) )
+    metrics.update( benchHeadless( 4 * scale ) )
+    metrics.update( benchRender( 200 * scale ) )
+    return { name: {"value": value, "unit": unit, "better": better} for name, ( value, unit, better ) in metrics.items() }
+
+
+def compare( metrics, baseline, tolerance ):
+    # returns the metrics that got worse than the baseline by more than tolerance
+    regressions = []
+    for name, metric in metrics.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["value"]
+        new = metric["value"]
+        if metric["better"] == "lower":
+            worse = new > old * ( 1 + tolerance )
+        else:
+            worse = new < old * ( 1 - tolerance )
+        if worse:
+            regressions.append( (name, old, new, metric["unit"]) )
+    return regressions
+
+
+def overTick( metrics ):
+    # decisions whose p95 does not fit in a tick, whatever the baseline says
+    return [
+        (name, metric["value"]) for name, metric in metrics.items()
+        if name.startswith( "decision." ) and name.endswith( ".p95" ) and metric["value"] > TICK_MS
+    ]
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description="bot latency, collision, simulation and render benchmarks" )
+    parser.add_argument( "--output", default="bench.json", help="where the results are written" )
+    parser.add_argument( "--baseline", default=DEFAULT_BASELINE, help="results to compare with" )
+    parser.add_argument( "--save-baseline", action="store_true", help="store this run as the new baseline" )
+    parser.add_argument( "--tolerance", type=float, default=TOLERANCE )
+    parser.add_argument( "--quick", action="store_true", help="fewer repeats" )
+    args = parser.parse_args( argv )
+
+    metrics = runBenchmarks( args.quick )
+    with open( args.output, "w" ) as f:
+        json.dump( metrics, f, indent=4 )
+    for name, metric in metrics.items():
+        print( f"{name}: {metric['value']:.3f} {metric['unit']}" )
+    slow = overTick( metrics )
+    for name, value in slow:
+        print( f"OVER TICK {name}: {value:.3f} ms > {TICK_MS:.3f} ms" )
+    failed = 1 if slow else 0
+
+    if args.save_baseline:
+        with open( args.baseline, "w" ) as f:
+            json.dump( metrics, f, indent=4 )
+        print( f"baseline saved in {args.baseline}" )
+        return failed
+
+    if not os.path.exists( args.baseline ):
+        print( f"no baseline at {args.baseline}, run with --save-baseline first" )
+        return failed
+    with open( args.baseline ) as f:
+        baseline = json.load( f )
+    regressions = compare( metrics, baseline, args.tolerance )
+    for name, old, new, unit in regressions:
+        print( f"REGRESSION {name}: {old:.3f} -> {new:.3f} {unit}" )
+    return 1 if regressions or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
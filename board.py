@@ -0,0 +1,88 @@
+# occupancy grid shared by every player
+# one byte per cell holding the owner id of the trail on it (0 when the cell is free)
+# when numpy is there and the board is not huge, it also keeps a summed-area table of the occupied
+# cells, so the number of free cells in any rectangle costs four lookups
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EMPTY = 0
+# one cell of trail updates a quarter of the table on average, past this size the row scan is cheaper
+SAT_MAX_CELLS = 1 << 20
+
+
+class Board:
+    def __init__( self, width, height ):
+        self.width = width
+        self.height = height
+        self.cells = bytearray( width * height )
+        self.sat = None
+        if np is not None and width * height <= SAT_MAX_CELLS:
+            # sat[y, x] = occupied cells in the rectangle (0, 0) -> (x-1, y-1)
+            self.sat = np.zeros( (height + 1, width + 1), dtype=np.int32 )
+            self.sat_view = memoryview( self.sat ).cast( "B" ).cast( "i" )
+
+    def index( self, x, y ):
+        return y * self.width + x
+
+    def isInside( self, x, y ):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def isFree( self, x, y ):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.width + x] == EMPTY
+        return False
+
+    def get( self, x, y ):
+        return self.cells[y * self.width + x]
+
+    def set( self, x, y, owner ):
+        i = y * self.width + x
+        was_free = self.cells[i] == EMPTY
+        self.cells[i] = owner
+        if self.sat is not None and was_free != ( owner == EMPTY ):
+            # one or two new cells per tick, a single slice update each
+            self.sat[y + 1:, x + 1:] += 1 if was_free else -1
+
+    def countFree( self, x0, y0, x1, y1 ):
+        # number of free cells in the inclusive rectangle, clipped to the board
+        x0 = max( x0, 0 )
+        y0 = max( y0, 0 )
+        x1 = min( x1, self.width - 1 )
+        y1 = min( y1, self.height - 1 )
+        if x0 > x1 or y0 > y1:
+            return 0
+        if self.sat is not None:
+            sat = self.sat_view
+            stride = self.width + 1
+            top = y0 * stride
+            bottom = ( y1 + 1 ) * stride
+            occupied = sat[bottom + x1 + 1] - sat[top + x1 + 1] - sat[bottom + x0] + sat[top + x0]
+            return ( x1 - x0 + 1 ) * ( y1 - y0 + 1 ) - occupied
+        free = 0
+        cells = self.cells
+        for y in range( y0, y1 + 1 ):
+            start = y * self.width
+            free += cells.count( EMPTY, start + x0, start + x1 + 1 )
+        return free
+
+    def load( self, cells ):
+        # replace the whole board at once, the summed-area table is rebuilt from scratch
+        self.cells[:] = cells
+        if self.sat is not None:
+            occupied = np.frombuffer( self.cells, dtype=np.uint8 ).reshape( self.height, self.width ) != EMPTY
+            self.sat[1:, 1:] = occupied.cumsum( axis=0, dtype=np.int32 ).cumsum( axis=1, dtype=np.int32 )
+
+    def clear( self ):
+        self.cells[:] = bytes( len( self.cells ) )
+        if self.sat is not None:
+            self.sat[:] = 0
+
+    def copy( self ):
+        board = Board( self.width, self.height )
+        board.cells[:] = self.cells
+        if self.sat is not None:
+            board.sat[:] = self.sat
+        return board
@@ -0,0 +1,80 @@
+import mmap
+import os
+import struct
+from hashlib import blake2b
+
+# opening book, the move of the bot for the positions of the first ticks from the fixed start
+# "python tron.py --book" builds it once with deep searches (bookbuilder.py), the game only reads it
+# the file is a header and records sorted by key, it is mapped in memory and looked up by binary
+# search, so opening it costs nothing and the processes of the bots share the same pages
+#   key   64 bits of blake2b over the board cells and the heads, the worker of a bot only gets the
+#         board and the heads so the key can not come from the trails
+#   move  index in DIRECTIONS of the move of the player asking
+
+BOOK_FILE = "opening.book"
+MAGIC = b"TRBK"
+VERSION = 1
+# magic, version, width, height, most occupied cells of a position in the book, record count
+HEADER = struct.Struct( "<4sHHHII" )
+RECORD = struct.Struct( "<QB" )
+HEADS = struct.Struct( "<BHHBHHB" )
+
+
+def positionKey( cells, player, me, my_heading, other, other_heading ):
+    digest = blake2b( cells, digest_size=8 )
+    digest.update( HEADS.pack( player, me[0], me[1], my_heading, other[0], other[1], other_heading ) )
+    return int.from_bytes( digest.digest(), "little" )
+
+
+def writeBook( path, width, height, entries ):
+    # entries: key -> (occupied cells, move)
+    max_filled = max( ( filled for filled, _ in entries.values() ), default=0 )
+    with open( path, "wb" ) as f:
+        f.write( HEADER.pack( MAGIC, VERSION, width, height, max_filled, len( entries ) ) )
+        for key in sorted( entries ):
+            f.write( RECORD.pack( key, entries[key][1] ) )
+
+
+class OpeningBook:
+    def __init__( self, path ):
+        with open( path, "rb" ) as f:
+            self.data = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
+        magic, version, self.width, self.height, self.max_filled, self.count = HEADER.unpack_from( self.data )
+        if magic != MAGIC or version != VERSION or len( self.data ) != HEADER.size + self.count * RECORD.size:
+            self.data.close()
+            raise ValueError( f"{path} is not an opening book of version {VERSION}" )
+
+    def __len__( self ):
+        return self.count
+
+    def find( self, key ):
+        low = 0
+        high = self.count
+        while low < high:
+            middle = ( low + high ) // 2
+            found, move = RECORD.unpack_from( self.data, HEADER.size + middle * RECORD.size )
+            if found == key:
+                return move
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup( self, board, player, me, my_heading, other, other_heading ):
+        # move of the book or None, past the opening the board is not even hashed
+        if board.width != self.width or board.height != self.height:
+            return None
+        filled = board.width * board.height - board.countFree( 0, 0, board.width - 1, board.height - 1 )
+        if filled > self.max_filled:
+            return None
+        return self.find( positionKey( board.cells, player, me, my_heading, other, other_heading ) )
+
+    def close( self ):
+        self.data.close()
+
+
+def loadBook( path=BOOK_FILE ):
+    if not os.path.exists( path ):
+        return None
+    return OpeningBook( path )
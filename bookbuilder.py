@@ -0,0 +1,114 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from board import Board
+from book import BOOK_FILE, positionKey, writeBook
+from engine import GRID_WIDTH, GRID_HEIGHT, DIRECTIONS, DIRECTION_CODES, startPositions
+from search import AlphaBetaSearch
+
+# builds the opening book of the two player match from the fixed start
+# for each side, every position of the first plies is searched far deeper than a bot can afford
+# during a match, the side plays the move found and the other player every move it has, so the
+# positions of a ply are the 3^ply answers to the book line (the same board is searched once)
+# a ply is searched on all cores at once
+#   python tron.py --book --plies 5 --nodes 5000
+
+BOOK_PLIES = 5
+BOOK_NODES = 5000
+BOOK_TERRITORY_DEPTH = 12
+
+# one search per process and board size, its buffers take a while to fill
+searches = {}
+
+
+def searchPosition( width, height, cells, me, my_heading, other, other_heading, nodes, territory_depth ):
+    search = searches.get( (width, height) )
+    if search is None:
+        search = searches[(width, height)] = AlphaBetaSearch( width, height )
+    board = Board( width, height )
+    board.load( cells )
+    move = search.bestMove(
+        board, me, DIRECTIONS[my_heading], other, DIRECTIONS[other_heading], None, None, territory_depth, nodes
+    )
+    return DIRECTION_CODES[move] if move is not None else None
+
+
+def replies( cells, width, height, x, y, heading, taken ):
+    # headings the other player can take without hitting a wall or the new head of the side
+    for turn in ( 0, 1, 3 ):
+        h = ( heading + turn ) & 3
+        nx = x + DIRECTIONS[h][0]
+        ny = y + DIRECTIONS[h][1]
+        if 0 <= nx < width and 0 <= ny < height and cells[ny * width + nx] == 0 and (nx, ny) != taken:
+            yield h
+
+
+def buildBook( plies, nodes, territory_depth, width=GRID_WIDTH, height=GRID_HEIGHT, workers=None, on_ply=None ):
+    # returns key -> (occupied cells, move), ready for writeBook
+    entries = {}
+    starts = [ (x, y, DIRECTION_CODES[direction]) for x, y, direction in startPositions( width, height, 2 ) ]
+    # (side, cells, heads), side is the index of the player the book plays
+    layer = [ (side, bytes( width * height ), starts) for side in range( 2 ) ]
+
+    with ProcessPoolExecutor( max_workers=workers ) as pool:
+        for ply in range( plies ):
+            start = perf_counter()
+            futures = []
+            for side, cells, heads in layer:
+                ( x, y, heading ), ( ox, oy, other_heading ) = heads[side], heads[1 - side]
+                futures.append( pool.submit(
+                    searchPosition, width, height, cells, (x, y), heading, (ox, oy), other_heading, nodes, territory_depth
+                ) )
+
+            children = {}
+            for ( side, cells, heads ), future in zip( layer, futures ):
+                move = future.result()
+                if move is None:
+                    continue
+                ( x, y, heading ), ( ox, oy, other_heading ) = heads[side], heads[1 - side]
+                key = positionKey( cells, side + 1, (x, y), heading, (ox, oy), other_heading )
+                entries[key] = ( 2 * ply, move )
+
+                # both heads turn into trail, as in TronGame.step
+                nx = x + DIRECTIONS[move][0]
+                ny = y + DIRECTIONS[move][1]
+                board = bytearray( cells )
+                board[y * width + x] = side + 1
+                board[oy * width + ox] = 2 - side
+                if board[ny * width + nx]:
+                    continue
+                board = bytes( board )
+                for reply in replies( board, width, height, ox, oy, other_heading, (nx, ny) ):
+                    new_heads = [None, None]
+                    new_heads[side] = (nx, ny, move)
+                    new_heads[1 - side] = (ox + DIRECTIONS[reply][0], oy + DIRECTIONS[reply][1], reply)
+                    children[(side, board, tuple( new_heads ))] = None
+            layer = list( children )
+            if on_ply is not None:
+                on_ply( ply, len( futures ), perf_counter() - start )
+    return entries
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --book", description="build the opening book of the search bots" )
+    parser.add_argument( "--book", action="store_true" )
+    parser.add_argument( "--plies", type=int, default=BOOK_PLIES, help="ticks from the start covered by the book" )
+    parser.add_argument( "--nodes", type=int, default=BOOK_NODES, help="search budget of every position" )
+    parser.add_argument( "--territory-depth", type=int, default=BOOK_TERRITORY_DEPTH )
+    parser.add_argument( "--width", type=int, default=GRID_WIDTH )
+    parser.add_argument( "--height", type=int, default=GRID_HEIGHT )
+    parser.add_argument( "--workers", type=int, default=None, help="defaults to the number of cores" )
+    parser.add_argument( "--output", default=BOOK_FILE )
+    args = parser.parse_args( argv )
+
+    def progress( ply, positions, elapsed ):
+        print( f"ply {ply + 1}: {positions} positions in {elapsed:.1f}s" )
+
+    entries = buildBook( args.plies, args.nodes, args.territory_depth, args.width, args.height, args.workers, progress )
+    writeBook( args.output, args.width, args.height, entries )
+    print( f"{len( entries )} positions written in {args.output}" )
+
+
+if __name__ == "__main__":
+    main()
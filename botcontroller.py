@@ -0,0 +1,130 @@
+import atexit
+import threading
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+from board import Board
+from engine import Player
+
+# runs a bot away from the game loop
+# the board is copied into shared memory after every tick, the worker thinks on it and posts the
+# direction back, the game loop either takes whatever decision is ready or holds the tick until the
+# decision of the current tick is in (lockstep, the match is then the same as a synchronous one)
+
+
+def botWorker( conn, shm_name, width, height, index, difficulty, scoring, seed, reaction_ticks ):
+    shm = SharedMemory( name=shm_name )
+    try:
+        board = Board( width, height )
+        me = Player( 0, 0, [1, 0], index + 1 )
+        # opponents are only positions and directions, the players are reused from tick to tick
+        pool = []
+        me.scoring = scoring
+        me.rng.seed( seed )
+        last_generation = 0
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            generation, tick, me_pos, me_dir, opponents = request
+            if generation != last_generation:
+                me.think_cooldown = 0
+                me.separated = False
+                if me.filler is not None:
+                    me.filler.last_heads = None
+                last_generation = generation
+            # the game loop does not touch the shared board until the answer is posted
+            board.load( shm.buf[:width * height] )
+            me.x, me.y = me_pos
+            me.direction = me_dir
+            while len( pool ) < len( opponents ):
+                pool.append( Player( 0, 0, [1, 0], 0 ) )
+            others = pool[:len( opponents )]
+            for other, ( other_pos, other_dir ) in zip( others, opponents ):
+                other.x, other.y = other_pos
+                other.direction = other_dir
+            start = perf_counter()
+            me.updateBot( difficulty, board, others, reaction_ticks )
+            conn.send( (generation, tick, me.direction, perf_counter() - start) )
+    finally:
+        shm.close()
+
+
+class BotController:
+    def __init__( self, game, index, difficulty, scoring, use_process=True, profiler=None, reaction_ticks=0 ):
+        self.game = game
+        self.index = index
+        # the worker reports how long every decision took, it is recorded as "bot<n> think"
+        self.profiler = profiler
+        self.span_name = f"bot{index + 1} think"
+        board = game.board
+        self.size = board.width * board.height
+        self.shm = SharedMemory( create=True, size=self.size )
+        self.conn, child = Pipe()
+        args = ( child, self.shm.name, board.width, board.height, index, difficulty, scoring, game.rng.random(), reaction_ticks )
+        if use_process:
+            # the mcts of the worker plays its playouts itself (player.mcts_workers is 1), no processes of its own
+            self.worker = Process( target=botWorker, args=args, daemon=True )
+        else:
+            self.worker = threading.Thread( target=botWorker, args=args, daemon=True )
+        self.worker.start()
+        self.closed = False
+        atexit.register( self.close )
+        # results of an older game are dropped after a reset
+        self.generation = 0
+        self.busy = False
+        self.decision = None
+
+    def request( self ):
+        # ask for the move of the current tick, unless the worker is still on an older one
+        me = self.game.players[self.index]
+        if self.busy or self.game.result is not None or not me.is_alive:
+            return
+        opponents = [ (other.getPos(), other.direction) for other in self.game.opponents( self.index ) ]
+        self.shm.buf[:self.size] = self.game.board.cells
+        self.conn.send( (self.generation, self.game.tick, me.getPos(), me.direction, opponents) )
+        self.busy = True
+
+    def poll( self ):
+        while self.conn.poll():
+            generation, tick, direction, elapsed = self.conn.recv()
+            self.busy = False
+            if self.profiler is not None:
+                self.profiler.record( self.span_name, elapsed )
+            if generation == self.generation and tick == self.game.tick:
+                self.decision = direction
+
+    def ready( self ):
+        # True once the worker answered the request of this tick (or has nothing to answer), never blocks
+        self.poll()
+        if self.decision is None and not self.busy:
+            # the last answer was for an older tick or game, ask again
+            self.request()
+        return self.decision is not None or not self.busy
+
+    def action( self ):
+        # decision for this tick, or None to keep the current direction
+        self.poll()
+        decision = self.decision
+        self.decision = None
+        return decision
+
+    def reset( self ):
+        self.generation += 1
+        self.decision = None
+
+    def close( self ):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.conn.send( None )
+        except OSError:
+            pass
+        self.worker.join( 1 )
+        if isinstance( self.worker, Process ) and self.worker.is_alive():
+            self.worker.terminate()
+            self.worker.join()
+        self.shm.close()
+        self.shm.unlink()
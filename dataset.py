@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+from itertools import islice
+from time import perf_counter
+
+import numpy as np
+
+from engine import TronGame, GRID_WIDTH, GRID_HEIGHT, DIRECTION_CODES, SCORING
+from headless import MAX_TICKS, parsePlayer
+
+# self-play samples for training evaluations offline
+#   python tron.py --dataset data/ --games 10000 --players bot:3,bot:5
+# a sample is one decision of one bot: the board, the heads and directions of every player, the move
+# it chose and how its match ended (1 won, 0 egality, -1 lost)
+# the samples are streamed: a match only keeps its decisions (a few numbers a tick) until its result
+# is known, the boards are rebuilt one tick after the other while its samples are given out
+# the shards are compressed npz files of at most SHARD_MB of raw arrays, index.json lists them with
+# the offset of their first sample and where the next shard starts, both are replaced atomically
+# the matches are seeded, so after an interruption the same command goes on from the last shard
+# (the match it was in is played again and its samples already written are skipped)
+
+SHARD_MB = 64
+INDEX_FILE = "index.json"
+# settings that must stay the same for the samples of a directory to go together
+CONFIG_KEYS = ( "width", "height", "players", "seed", "random_start" )
+
+
+def outcome( result, index ):
+    if not result:
+        return 0
+    return 1 if result == index + 1 else -1
+
+
+def matchSamples( game, difficulties, game_id, seed ):
+    # samples of one match: (game_id, tick, player index, board, heads, headings, alive, move, outcome)
+    # board is a bytes copy of the cells (owner id per cell) when the player had to decide
+    game.reset( seed )
+    decisions = []
+    while game.result is None and game.tick < MAX_TICKS:
+        players = game.players
+        heads = [ player.getPos() for player in players ]
+        headings = [ player.heading for player in players ]
+        alive = [ player.is_alive for player in players ]
+        actions = [ game.think( i, difficulty ) if alive[i] else None for i, difficulty in enumerate( difficulties ) ]
+        moves = [ DIRECTION_CODES[tuple( action )] if action is not None else -1 for action in actions ]
+        decisions.append( ( heads, headings, alive, moves ) )
+        game.step( actions )
+
+    result = game.result or 0
+    width = game.board.width
+    board = bytearray( width * game.board.height )
+    for tick, ( heads, headings, alive, moves ) in enumerate( decisions ):
+        snapshot = bytes( board )
+        for i in range( len( heads ) ):
+            if alive[i]:
+                yield ( game_id, tick, i, snapshot, heads, headings, alive, moves[i], outcome( result, i ) )
+        # every head alive becomes trail, as in TronGame.step
+        for i, ( x, y ) in enumerate( heads ):
+            if alive[i]:
+                board[y * width + x] = i + 1
+
+
+def selfPlaySamples( difficulties, games, seed=0, random_start=True, first_game=0, skip=0, scorings=None ):
+    # stream of the samples of the matches first_game .. games - 1, the skip first samples of
+    # first_game are left out (they are already in a shard)
+    game = TronGame( random_start=random_start, player_count=len( difficulties ) )
+    if scorings is not None:
+        for player, scoring in zip( game.players, scorings ):
+            player.scoring = scoring
+    for game_id in range( first_game, games ):
+        samples = matchSamples( game, difficulties, game_id, seed + game_id )
+        if game_id == first_game and skip:
+            samples = islice( samples, skip, None )
+        yield from samples
+
+
+def loadIndex( directory ):
+    path = os.path.join( directory, INDEX_FILE )
+    if not os.path.exists( path ):
+        return None
+    with open( path ) as f:
+        return json.load( f )
+
+
+def replaceFile( path, write ):
+    # a file is either the old one or the new one, never half written
+    temporary = path + ".tmp"
+    with open( temporary, "wb" ) as f:
+        write( f )
+        f.flush()
+        os.fsync( f.fileno() )
+    os.replace( temporary, path )
+
+
+class ShardWriter:
+    # fixed size arrays, filled sample after sample and written out when full
+    def __init__( self, directory, index, shard_mb=SHARD_MB ):
+        self.directory = directory
+        self.index = index
+        width, height = index["width"], index["height"]
+        players = len( index["players"] )
+        sample_bytes = width * height + players * ( 4 + 1 + 1 ) + 1 + 1 + 1 + 4 + 4
+        self.capacity = max( 1, shard_mb * ( 1 << 20 ) // sample_bytes )
+        self.boards = np.zeros( (self.capacity, height, width), dtype=np.uint8 )
+        self.heads = np.zeros( (self.capacity, players, 2), dtype=np.int16 )
+        self.headings = np.zeros( (self.capacity, players), dtype=np.int8 )
+        self.alive = np.zeros( (self.capacity, players), dtype=np.bool_ )
+        self.player = np.zeros( self.capacity, dtype=np.uint8 )
+        self.move = np.zeros( self.capacity, dtype=np.int8 )
+        self.outcome = np.zeros( self.capacity, dtype=np.int8 )
+        self.game = np.zeros( self.capacity, dtype=np.uint32 )
+        self.tick = np.zeros( self.capacity, dtype=np.uint32 )
+        self.count = 0
+        # position of the next sample: match and number of its samples already taken
+        self.next_game = index["next_game"]
+        self.skip = index["skip"]
+
+    def add( self, sample ):
+        game_id, tick, player, board, heads, headings, alive, move, result = sample
+        n = self.count
+        self.boards[n].reshape( -1 )[:] = np.frombuffer( board, dtype=np.uint8 )
+        self.heads[n] = heads
+        self.headings[n] = headings
+        self.alive[n] = alive
+        self.player[n] = player
+        self.move[n] = move
+        self.outcome[n] = result
+        self.game[n] = game_id
+        self.tick[n] = tick
+        self.count += 1
+        if game_id != self.next_game:
+            self.next_game = game_id
+            self.skip = 0
+        self.skip += 1
+        if self.count == self.capacity:
+            return self.flush()
+        return None
+
+    def flush( self, played=None ):
+        # writes the shard and the index, returns the index entry of the shard (None when empty)
+        # played is the number of matches of a run that went through all of them
+        index = self.index
+        # a run asking for fewer matches than the directory already went through leaves the position
+        # where it is, going back would write the samples of those matches a second time
+        if played is not None and self.next_game < played:
+            self.next_game = played
+            self.skip = 0
+        entry = None
+        n = self.count
+        if n:
+            name = f"shard-{len( index['shards'] ):05d}.npz"
+            path = os.path.join( self.directory, name )
+            replaceFile( path, lambda f: np.savez_compressed(
+                f, boards=self.boards[:n], heads=self.heads[:n], headings=self.headings[:n], alive=self.alive[:n],
+                player=self.player[:n], move=self.move[:n], outcome=self.outcome[:n], game=self.game[:n],
+                tick=self.tick[:n]
+            ) )
+            entry = { "file": name, "offset": index["samples"], "count": n, "bytes": os.path.getsize( path ) }
+            index["shards"].append( entry )
+            index["samples"] += n
+            self.count = 0
+        index["next_game"] = self.next_game
+        index["skip"] = self.skip
+        replaceFile(
+            os.path.join( self.directory, INDEX_FILE ),
+            lambda f: f.write( json.dumps( index, indent=4 ).encode() )
+        )
+        return entry
+
+
+def readShards( directory ):
+    # dict of arrays for every shard, in order
+    index = loadIndex( directory )
+    for entry in index["shards"]:
+        with np.load( os.path.join( directory, entry["file"] ) ) as data:
+            yield { name: data[name] for name in data.files }
+
+
+def generate( directory, players, games, seed=0, random_start=True, shard_mb=SHARD_MB, on_shard=None ):
+    # players are (difficulty, scoring) like in headless, returns the index
+    os.makedirs( directory, exist_ok=True )
+    config = {
+        "width": GRID_WIDTH,
+        "height": GRID_HEIGHT,
+        "players": [ f"bot:{difficulty}:{scoring}" for difficulty, scoring in players ],
+        "seed": seed,
+        "random_start": random_start
+    }
+    index = loadIndex( directory )
+    if index is None:
+        index = { **config, "games": games, "samples": 0, "next_game": 0, "skip": 0, "shards": [] }
+    elif any( index[key] != config[key] for key in CONFIG_KEYS ):
+        raise ValueError( f"{directory} holds samples of other settings ({', '.join( f'{key}={index[key]}' for key in CONFIG_KEYS )})" )
+    # more matches can be asked for later, the samples already there stay valid, a run asking for
+    # fewer keeps the total of the bigger one
+    index["games"] = max( index.get( "games", 0 ), games )
+
+    writer = ShardWriter( directory, index, shard_mb )
+    samples = selfPlaySamples(
+        [ difficulty for difficulty, _ in players ], games, seed, random_start,
+        index["next_game"], index["skip"], [ scoring for _, scoring in players ]
+    )
+    start = perf_counter()
+    for sample in samples:
+        entry = writer.add( sample )
+        if entry is not None and on_shard is not None:
+            on_shard( entry, index, perf_counter() - start )
+            start = perf_counter()
+    entry = writer.flush( games )
+    if entry is not None and on_shard is not None:
+        on_shard( entry, index, perf_counter() - start )
+    return index
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --dataset", description="write self-play samples in compressed shards" )
+    parser.add_argument( "--dataset", metavar="DIRECTORY", required=True )
+    parser.add_argument( "--games", type=int, default=1000, help="total matches, a resumed run goes on up to it" )
+    parser.add_argument( "--p1", type=parsePlayer, default=(3, SCORING) )
+    parser.add_argument( "--p2", type=parsePlayer, default=(3, SCORING) )
+    parser.add_argument( "--players", type=lambda specs: [ parsePlayer( spec ) for spec in specs.split( "," ) ],
+                         help="free for all, replaces --p1 / --p2, e.g. bot:2,bot:3,bot:4:territory" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--fixed-start", action="store_true", help="the bots would play the same match over and over" )
+    parser.add_argument( "--shard-mb", type=int, default=SHARD_MB, help="raw size of a shard before compression" )
+    args = parser.parse_args( argv )
+
+    def progress( entry, index, elapsed ):
+        print(
+            f"{entry['file']}: {entry['count']} samples ({entry['count'] / max( elapsed, 1e-9 ):.0f}/sec), "
+            f"{entry['bytes'] / ( 1 << 20 ):.1f} MB, {index['samples']} samples in {len( index['shards'] )} shards, "
+            f"next match {index['next_game']}"
+        )
+
+    try:
+        index = generate( args.dataset, args.players or [args.p1, args.p2], args.games, args.seed, not args.fixed_start, args.shard_mb, progress )
+    except ValueError as error:
+        parser.error( str( error ) )
+    print( f"{index['samples']} samples from {index['next_game']} matches in {args.dataset}" )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+from heapq import heappop, heappush
+
+from territory import TerritoryEvaluator
+
+# end of the match, once nobody else can reach the region of the bot it only has to fill it
+#   isolated   search from the head that stops at the first other head it meets
+#              a new wall can only cut a region when the free cells around it are not linked to each
+#              other, when no new wall does that since the last search the answer has not changed
+#   bestMove   small regions get an exact longest path (memoized on the cells left)
+#              up to LOOKAHEAD_CELLS a short lookahead: every path of FILL_DEPTH more moves is played
+#              out and what is left after it is scored on the chamber tree, the articulation points cut
+#              the region into chambers, a path fills the chamber it is in and then goes on into the
+#              best one behind it
+#              bigger regions take too long to score on every path, the same local test as isolated
+#              comes first: when the moves are linked around the head and none of them cuts the region,
+#              they all keep all of it, otherwise each move gets the chamber tree once
+#              between equal moves, the one along the most walls leaves no holes behind
+# a chamber counts as many cells as a path alternating black / white on a checkerboard can use
+# the buffers of the territory search are reused, nothing is allocated per cell
+# "python bench.py" plays random walled in regions with this filler and with a flood fill of every move
+# (the wall along the most walls between equal regions), the lookahead fills about a quarter more
+
+# regions up to this size are solved exactly, past SOLVER_NODES the exact search gives up
+EXACT_CELLS = 24
+SOLVER_NODES = 20000
+# moves played out after the first one, past FILL_LEAVES chamber scores the paths stop where they are
+FILL_DEPTH = 2
+FILL_LEAVES = 8
+# a chamber tree costs about a microsecond a cell, past this size the lookahead does not fit in a tick
+LOOKAHEAD_CELLS = 2000
+
+
+class SolverLimit( Exception ):
+    pass
+
+
+class SpaceFiller( TerritoryEvaluator ):
+    def __init__( self, width, height ):
+        TerritoryEvaluator.__init__( self, width, height )
+        self.nodes = 0
+        self.leaves = 0
+        # heads at the last isolated call that found an other head, None at the start of a match
+        self.last_heads = None
+
+    def neighborsOf( self, i ):
+        return self.neighbors[i] if self.neighbors is not None else self.around( i )
+
+    def splits( self, cells, x, y ):
+        # False when the free cells around (x, y) stay linked without it, it is then no articulation point
+        width, height = self.width, self.height
+
+        def free( cx, cy ):
+            return 0 <= cx < width and 0 <= cy < height and cells[cy * width + cx] == 0
+
+        # sides clockwise from the top, corners[k] links sides[k] and sides[k + 1]
+        sides = ( free( x, y - 1 ), free( x + 1, y ), free( x, y + 1 ), free( x - 1, y ) )
+        corners = ( free( x + 1, y - 1 ), free( x + 1, y + 1 ), free( x - 1, y + 1 ), free( x - 1, y - 1 ) )
+        groups = 0
+        for k in range( 4 ):
+            if sides[k] and not ( sides[k - 1] and corners[k - 1] ):
+                groups += 1
+        return groups > 1
+
+    def isolated( self, board, head, others ):
+        # True when no other head can be reached from head
+        width = self.width
+        cells = board.cells
+        heads = [ head ] + list( others )
+        last = self.last_heads
+        if last == heads:
+            # asked again before anybody moved (a second bot call in the same tick), no wall is new
+            return False
+        self.last_heads = None
+        if last is not None and len( last ) == len( heads ) and all(
+            any( abs( x - lx ) + abs( y - ly ) == 1 for lx, ly in last ) for x, y in heads
+        ) and not any(
+            cells[ly * width + lx] == 0 or self.splits( cells, lx, ly ) for lx, ly in last
+        ):
+            # every player went one cell further and none of the cells they left cut anything
+            self.last_heads = heads
+            return False
+
+        # best first search towards the closest other head: on an open board it walks straight there
+        # instead of flooding everything closer, a walled in bot still visits its whole region
+        targets = { y * width + x for x, y in others }
+        self.generation += 1
+        generation = self.generation
+        seen = self.seen1
+        start = head[1] * width + head[0]
+        seen[start] = generation
+        frontier = [ (0, start) ]
+        while frontier:
+            _, i = heappop( frontier )
+            for n in self.neighborsOf( i ):
+                if n in targets:
+                    self.last_heads = heads
+                    return False
+                if cells[n] == 0 and seen[n] != generation:
+                    seen[n] = generation
+                    y, x = divmod( n, width )
+                    heappush( frontier, ( min( abs( x - ox ) + abs( y - oy ) for ox, oy in others ), n ) )
+        return True
+
+    def articulations( self, cells, start ):
+        # articulation points of the free cells reachable from start (iterative tarjan)
+        self.generation += 1
+        generation = self.generation
+        seen = self.seen1
+        disc = self.dist1
+        low = self.dist2
+        parent = self.queue2
+        seen[start] = generation
+        disc[start] = low[start] = 0
+        parent[start] = -1
+        count = 1
+        root_children = 0
+        points = set()
+        stack = [ [start, self.neighborsOf( start ), 0] ]
+        while stack:
+            frame = stack[-1]
+            v, around, k = frame
+            if k < len( around ):
+                frame[2] = k + 1
+                w = around[k]
+                if cells[w]:
+                    continue
+                if seen[w] != generation:
+                    seen[w] = generation
+                    disc[w] = low[w] = count
+                    count += 1
+                    parent[w] = v
+                    stack.append( [w, self.neighborsOf( w ), 0] )
+                elif w != parent[v] and disc[w] < low[v]:
+                    low[v] = disc[w]
+            else:
+                stack.pop()
+                if stack:
+                    p = stack[-1][0]
+                    if low[v] < low[p]:
+                        low[p] = low[v]
+                    if p == start:
+                        root_children += 1
+                    elif low[v] >= disc[p]:
+                        points.add( p )
+        if root_children > 1:
+            points.add( start )
+        return points
+
+    def chamberScores( self, cells, start, targets ):
+        # cells a path from the head at start can fill after going to each target, start must be free
+        width = self.width
+        points = self.articulations( cells, start )
+        self.generation += 1
+        generation = self.generation
+        seen = self.seen1
+        queue = self.queue1
+        owners = {}
+        # chamber tree, a chamber is a single articulation point or the cells between them
+        sizes = []
+        parents = []
+        work = [ (start, -1) ]
+        while work:
+            entry, parent = work.pop()
+            if seen[entry] == generation:
+                continue
+            node = len( sizes )
+            seen[entry] = generation
+            queue[0] = entry
+            tail = 1
+            head = 0
+            colors = [0, 0]
+            while head < tail:
+                i = queue[head]
+                head += 1
+                if i in targets:
+                    owners[i] = node
+                y, x = divmod( i, width )
+                colors[( x + y ) & 1] += 1
+                for n in self.neighborsOf( i ):
+                    if cells[n] or seen[n] == generation:
+                        continue
+                    if n in points or entry in points:
+                        # the way into another chamber
+                        work.append( (n, node) )
+                    else:
+                        seen[n] = generation
+                        queue[tail] = n
+                        tail += 1
+            y, x = divmod( entry, width )
+            same = colors[( x + y ) & 1]
+            other = colors[( x + y + 1 ) & 1]
+            sizes.append( 2 * other + 1 if same > other else 2 * same )
+            parents.append( parent )
+
+        best_child = [0] * len( sizes )
+        for node in range( len( sizes ) - 1, 0, -1 ):
+            value = sizes[node] + best_child[node]
+            parent = parents[node]
+            if value > best_child[parent]:
+                best_child[parent] = value
+        # a target in the chamber of the head keeps all of it (less the head), one behind an articulation
+        # point only gets what is behind it
+        return [
+            sizes[0] + best_child[0] - 1 if owners[i] == 0 else sizes[owners[i]] + best_child[owners[i]]
+            for i in targets
+        ]
+
+    def longest( self, i, mask, index, memo ):
+        # exact number of cells a path can still fill from cell i, mask holds the cells already used
+        key = ( i, mask )
+        value = memo.get( key )
+        if value is not None:
+            return value
+        self.nodes += 1
+        if self.nodes > SOLVER_NODES:
+            raise SolverLimit()
+        value = 0
+        for n in self.neighborsOf( i ):
+            bit = index.get( n )
+            if bit is not None and not mask & bit:
+                length = 1 + self.longest( n, mask | bit, index, memo )
+                if length > value:
+                    value = length
+        memo[key] = value
+        return value
+
+    def regionSize( self, cells, targets, limit ):
+        # free cells reachable from the targets, the count stops at limit + 1
+        # they are left at the front of queue1, in the order they were found
+        self.generation += 1
+        generation = self.generation
+        seen = self.seen1
+        queue = self.queue1
+        tail = 0
+        for i in targets:
+            if seen[i] != generation:
+                seen[i] = generation
+                queue[tail] = i
+                tail += 1
+        head = 0
+        while head < tail and tail <= limit:
+            i = queue[head]
+            head += 1
+            for n in self.neighborsOf( i ):
+                if cells[n] == 0 and seen[n] != generation:
+                    seen[n] = generation
+                    queue[tail] = n
+                    tail += 1
+        return min( tail, limit + 1 )
+
+    def exactScores( self, cells, targets ):
+        # None when the region is too big or the search too long
+        size = self.regionSize( cells, targets, EXACT_CELLS )
+        if size > EXACT_CELLS:
+            return None
+        # a bit for every free cell of the region
+        queue = self.queue1
+        index = { queue[k]: 1 << k for k in range( size ) }
+        self.nodes = 0
+        memo = {}
+        try:
+            return [ 1 + self.longest( i, index[i], index, memo ) for i in targets ]
+        except SolverLimit:
+            return None
+
+    def bestMove( self, board, head, direction ):
+        # move that fills the most of the region, None when the bot is stuck
+        width = self.width
+        cells = board.cells
+        x, y = head
+        dx, dy = direction
+        moves = [
+            d for d in ( (dx, dy), (-dy, dx), (dy, -dx) )
+            if board.isFree( x + d[0], y + d[1] )
+        ]
+        if len( moves ) < 2:
+            return moves[0] if moves else None
+
+        start = y * width + x
+        targets = [ ( y + d[1] ) * width + x + d[0] for d in moves ]
+        # the head is not on the board, it is a wall for every path from here
+        cells[start] = 255
+        try:
+            scores = self.exactScores( cells, targets )
+            if scores is None and self.regionSize( cells, targets, LOOKAHEAD_CELLS ) <= LOOKAHEAD_CELLS:
+                self.leaves = 0
+                scores = [ self.lookahead( cells, x + d[0], y + d[1], d, FILL_DEPTH ) for d in moves ]
+            if scores is None:
+                # a big region, the moves are linked around the head and none of them cuts what is behind it
+                if not self.splits( cells, x, y ) and not any( self.splits( cells, x + d[0], y + d[1] ) for d in moves ):
+                    # only a dead end loses the region
+                    scores = [ 0 if self.freeAround( cells, i ) else -1 for i in targets ]
+                else:
+                    # the tarjan search starts from the head, it is free for that time
+                    cells[start] = 0
+                    scores = self.chamberScores( cells, start, targets )
+                    cells[start] = 255
+            best = max(
+                range( len( moves ) ),
+                key=lambda k: ( scores[k], -self.freeAround( cells, targets[k] ) )
+            )
+        finally:
+            cells[start] = 0
+        return moves[best]
+
+    def lookahead( self, cells, x, y, direction, depth ):
+        # cells a path entering (x, y) can fill, counting it, the cells behind it are already walls
+        width = self.width
+        height = self.height
+        i = y * width + x
+        dx, dy = direction
+        moves = []
+        for d in ( (dx, dy), (-dy, dx), (dy, -dx) ):
+            nx = x + d[0]
+            ny = y + d[1]
+            if 0 <= nx < width and 0 <= ny < height and cells[ny * width + nx] == 0:
+                moves.append( d )
+        if not moves:
+            return 1
+        if depth == 0 or self.leaves >= FILL_LEAVES:
+            self.leaves += 1
+            return 1 + max( self.chamberScores( cells, i, [ ( y + d[1] ) * width + x + d[0] for d in moves ] ) )
+        cells[i] = 255
+        try:
+            return 1 + max( self.lookahead( cells, x + d[0], y + d[1], d, depth - 1 ) for d in moves )
+        finally:
+            cells[i] = 0
+
+    def freeAround( self, cells, i ):
+        return sum( 1 for n in self.neighborsOf( i ) if cells[n] == 0 )
@@ -0,0 +1,509 @@
+import json
+import math
+import os
+import random
+from array import array
+
+from board import Board
+from territory import TerritoryEvaluator
+from search import AlphaBetaSearch
+from mcts import MonteCarloSearch
+from endgame import SpaceFiller
+from book import loadBook
+from evaluator import loadEvaluator
+
+# arena settings (in cells)
+GRID_WIDTH = 160
+GRID_HEIGHT = 120
+
+# AI settings
+# a bot decides at most once every REACTION_TICKS ticks
+REACTION_TICKS = 1
+RADIUS_AI_VISION = 8
+AGGRESSION = 1
+LOOKAHEAD_DEPTH = 3
+# how the lookahead scores a position: "space" (fast_space and distance), "territory" (voronoi regions)
+# or "learned" (a model trained on self-play, see evaluator.py, all the leaves are scored in one batch)
+SCORING = "space"
+TERRITORY_DEPTH = RADIUS_AI_VISION
+# difficulty 4 and up use the alpha-beta search, it is stopped after a number of positions and not by
+# the clock so the same position always gets the same move, whatever the load of the machine
+# a leaf costs a territory search of about depth² cells, SEARCH_NODES is the budget of a TERRITORY_DEPTH
+# search and a deeper territory gets fewer nodes for the same time (searchNodes)
+#   difficulty 4  120 nodes, territory of 8 cells, mostly 3 moves deep
+#   difficulty 5  76 nodes, territory of 10 cells, mostly 2 moves deep
+# both take about 10 ms p50 / 18 ms p95, difficulty 5 sees farther at the leaves and won 29, lost 7 and
+# drew 4 of 40 seeded matches against difficulty 4
+SEARCH_NODES = 120
+SEARCH_DEPTHS = {4: 3, 5: 3}
+SEARCH_TERRITORY_DEPTHS = {4: TERRITORY_DEPTH, 5: 10}
+# the clock is only a backstop for a slow or busy machine: a search still running after SEARCH_DEADLINE
+# seconds plays its last finished iteration, under a tick at the default tick rate (30) so a lockstep
+# bot never holds the game back, its move can then differ from one run to the next
+SEARCH_DEADLINE = 0.025
+# difficulty 6 is a monte carlo tree search, same reason for a playout count instead of a time budget
+# a bot plays its playouts itself unless it is given processes (player.mcts_workers), the game gives
+# MCTS_WORKERS to the bots it runs in its own process, the bot processes, tournament and tuner workers
+# already fill the cores and keep 1
+MCTS_PLAYOUTS = 64
+MCTS_WORKERS = os.cpu_count() or 1
+
+# every bot plays with DEFAULT_PARAMS unless it gets its own (player.params) or plays a preset
+DEFAULT_PARAMS = {
+    "aggression": AGGRESSION,
+    "vision": RADIUS_AI_VISION,
+    "lookahead_depth": LOOKAHEAD_DEPTH,
+    # weight of the free cells next to the end of a lookahead path, 0 keeps the plain space / distance blend
+    "mobility": 0
+}
+# presets are new difficulties made of a base difficulty and its params, "python tron.py --tune" writes them
+# a preset can also set "reaction_ticks", it then replaces the reaction the game asks for
+PRESETS_FILE = "presets.json"
+
+
+def loadPresets( path=PRESETS_FILE ):
+    if not os.path.exists( path ):
+        return {}
+    with open( path ) as f:
+        presets = json.load( f )
+    return {
+        int( difficulty ): { "base": preset["base"], "params": { **DEFAULT_PARAMS, **preset["params"] } }
+        for difficulty, preset in presets.items()
+    }
+
+
+def searchNodes( territory_depth ):
+    # node budget of a search scoring its leaves with a territory of territory_depth cells
+    return SEARCH_NODES * TERRITORY_DEPTH ** 2 // territory_depth ** 2
+
+
+PRESETS = loadPresets()
+# moves of the search bots for the first ticks of a two player match, "python tron.py --book" builds it
+BOOK = loadBook()
+
+# a direction is stored as its index in DIRECTIONS, turning left / right is -1 / +1, going back is +2
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+DIRECTION_CODES = { d: i for i, d in enumerate( DIRECTIONS ) }
+
+
+class Player:
+    # the trail is a packed array of cell indices (y * width + x), two bytes per cell when the board allows it
+    __slots__ = (
+        "start_pos", "start_direction", "think_cooldown", "rng", "scoring", "territory", "search",
+        "mcts", "mcts_workers", "params", "filler", "separated", "evaluator", "is_alive", "heading", "trail", "player", "x", "y", "width"
+    )
+
+    def __init__( self, x, y, direction, player, width=GRID_WIDTH, height=GRID_HEIGHT ):
+        self.start_pos = (x, y)
+        self.start_direction = tuple( direction )
+        self.think_cooldown = 0
+        self.rng = random.Random()
+        self.scoring = SCORING
+        self.territory = None
+        self.search = None
+        self.mcts = None
+        self.mcts_workers = 1
+        self.params = DEFAULT_PARAMS
+        self.filler = None
+        # set once no other player can reach this one any more, it never changes back during a match
+        self.separated = False
+        self.evaluator = None
+
+        self.is_alive = True
+        self.heading = DIRECTION_CODES[self.start_direction]
+        self.width = width
+        self.trail = array( "H" if width * height <= 0x10000 else "I" )
+        self.player = player
+        self.x = x
+        self.y = y
+
+    @property
+    def direction( self ):
+        return DIRECTIONS[self.heading]
+
+    @direction.setter
+    def direction( self, direction ):
+        self.heading = DIRECTION_CODES[tuple( direction )]
+
+    def update( self, board ):
+        board.set( self.x, self.y, self.player )
+        self.trail.append( self.y * self.width + self.x )
+        dx, dy = DIRECTIONS[self.heading]
+        self.x += dx
+        self.y += dy
+
+    def turn( self, direction ):
+        # a player can never go back on its own trail
+        heading = DIRECTION_CODES[tuple( direction )]
+        if heading != ( self.heading + 2 ) & 3:
+            self.heading = heading
+
+    def getTrail( self ):
+        # read-only view of the cell indices, nothing is copied
+        return memoryview( self.trail ).toreadonly()
+
+    def trailCells( self, start=0 ):
+        # (x, y) of the trail cells from the start-th one
+        width = self.width
+        trail = self.trail
+        for i in range( start, len( trail ) ):
+            y, x = divmod( trail[i], width )
+            yield x, y
+
+    def updateBot( self, difficulty, board, others, reaction_ticks=0 ):
+        # others are the opponents still alive, the lookahead and the search play against the closest one
+        # called once per tick, the bot keeps its direction until the cooldown is over
+        params = self.params
+        preset = PRESETS.get( difficulty )
+        if preset is not None:
+            difficulty = preset["base"]
+            params = preset["params"]
+        if self.think_cooldown > 0:
+            self.think_cooldown -= 1
+            return
+        self.think_cooldown = params.get( "reaction_ticks", reaction_ticks ) - 1
+        vision = params["vision"]
+        aggression = params["aggression"]
+        mobility = params["mobility"]
+
+        # cells the other players hold or are about to enter, they are not written on the board yet
+        # cells of everybody but the closest opponent are the crowd, the two player evaluations see them as walls
+        crowd = frozenset()
+        if len( others ) == 1:
+            other = others[0]
+            blocked = other.getPossibleCells()
+        else:
+            blocked = set()
+            for player in others:
+                blocked.update( player.getPossibleCells() )
+            # alone on the board the bot plays against itself, the evaluations still work
+            other = min( others, key=lambda player: abs( player.x - self.x ) + abs( player.y - self.y ), default=self )
+            crowd = blocked.difference( other.getPossibleCells() if other is not self else () )
+
+        def is_free(x, y):
+            return board.isFree(x, y) and (x, y) not in blocked
+
+        dx, dy = self.direction
+        dirs = [(dx, dy), (-dy, dx), (dy, -dx)]
+        moves = []
+        for d in dirs:
+            nx = self.x + d[0]
+            ny = self.y + d[1]
+            if is_free(nx, ny):
+                moves.append(d)
+
+
+        if not moves:
+            return
+
+        if difficulty == 1:
+            self.direction = self.rng.choice( moves )
+            return
+
+        def fast_space(x, y):
+            score = board.countFree(
+                x - vision, y - vision,
+                x + vision, y + vision
+            )
+            for bx, by in blocked:
+                if abs(bx - x) <= vision and abs(by - y) <= vision and board.isFree(bx, by):
+                    score -= 1
+            return score
+
+        if difficulty == 2:
+            best = max(
+                moves, key=lambda d: fast_space(
+                    self.x + d[0],
+                    self.y + d[1]
+                )
+            )
+            self.direction = best
+            return
+
+        # from difficulty 3, a bot walled in alone stops playing against the others and fills its region
+        if self.filler is None or self.filler.width != board.width or self.filler.height != board.height:
+            self.filler = SpaceFiller( board.width, board.height )
+        if not self.separated:
+            self.separated = self.filler.isolated( board, (self.x, self.y), [ player.getPos() for player in others ] )
+        if self.separated:
+            best = self.filler.bestMove( board, (self.x, self.y), self.direction )
+            self.direction = best if best is not None else moves[0]
+            return
+
+        if difficulty >= 4 and BOOK is not None and len( others ) == 1:
+            heading = BOOK.lookup( board, self.player, (self.x, self.y), self.heading, other.getPos(), other.heading )
+            if heading is not None and DIRECTIONS[heading] in moves:
+                self.direction = DIRECTIONS[heading]
+                return
+
+        if difficulty >= 6:
+            if self.mcts is None or self.mcts.width != board.width or self.mcts.height != board.height:
+                self.mcts = MonteCarloSearch( board.width, board.height, self.mcts_workers )
+            walls = [ board.index( x, y ) for x, y in crowd if board.isFree( x, y ) and (x, y) != (self.x, self.y) ]
+            for i in walls:
+                board.cells[i] = 255
+            try:
+                best = self.mcts.bestMove(
+                    board, (self.x, self.y), self.direction, other.getPos(), other.direction,
+                    MCTS_PLAYOUTS, self.rng
+                )
+            finally:
+                for i in walls:
+                    board.cells[i] = 0
+            self.direction = best if best is not None else moves[0]
+            return
+
+        if difficulty >= 4:
+            if self.search is None or self.search.width != board.width or self.search.height != board.height:
+                self.search = AlphaBetaSearch( board.width, board.height )
+            # the search only reads the cells, the crowd is written there for its duration
+            walls = [ board.index( x, y ) for x, y in crowd if board.isFree( x, y ) and (x, y) != (self.x, self.y) ]
+            for i in walls:
+                board.cells[i] = 255
+            territory_depth = SEARCH_TERRITORY_DEPTHS[difficulty]
+            try:
+                best = self.search.bestMove(
+                    board, (self.x, self.y), self.direction, other.getPos(), other.direction,
+                    SEARCH_DEADLINE, SEARCH_DEPTHS[difficulty], territory_depth, searchNodes( territory_depth )
+                )
+            finally:
+                for i in walls:
+                    board.cells[i] = 0
+            self.direction = best if best is not None else moves[0]
+            return
+
+        def valid_moves(x, y, direction):
+            dx, dy = direction
+            dirs = [(dx, dy), (-dy, dx), (dy, -dx)]
+            moves = []
+            for d in dirs:
+                if is_free(x + d[0], y + d[1]):
+                    moves.append(d)
+            return moves
+
+        other_x, other_y = other.getPos()
+        own_head = (self.x, self.y)
+
+        if self.scoring == "territory":
+            if self.territory is None or self.territory.width != board.width or self.territory.height != board.height:
+                self.territory = TerritoryEvaluator( board.width, board.height )
+            territory = self.territory
+        if self.scoring == "learned" and self.evaluator is None:
+            self.evaluator = loadEvaluator()
+
+        def evaluate(x, y, occ):
+            if self.scoring == "territory":
+                # path cells are not on the board yet
+                _, _, mine, theirs = territory.evaluate(
+                    board, (x, y), (other_x, other_y),
+                    occ | {own_head} | crowd, vision
+                )
+                score = mine - theirs
+            else:
+                space = fast_space(x, y)
+                dist = abs(x - other_x) + abs(y - other_y)
+                score = space * (1 - aggression) - dist * aggression
+            if mobility:
+                score += mobility * sum(
+                    1 for dx, dy in DIRECTIONS if is_free(x + dx, y + dy) and (x + dx, y + dy) not in occ
+                )
+            return score
+
+        # every path of lookahead_depth moves ends on a leaf, the leaves are all scored at the end
+        # roots[k] is the first move of the path of leaves[k]
+        leaves = []
+        roots = []
+
+        def expand(x, y, direction, occ, depth, root):
+            if depth == 0:
+                leaves.append((x, y, occ))
+                roots.append(root)
+                return
+
+            for d in valid_moves(x, y, direction):
+                nx = x + d[0]
+                ny = y + d[1]
+                if (nx, ny) in occ:
+                    continue
+                expand(
+                    nx, ny, d,
+                    occ | {(nx, ny)},
+                    depth - 1, root
+                )
+
+        for k, d in enumerate(moves):
+            nx = self.x + d[0]
+            ny = self.y + d[1]
+            expand(
+                nx, ny, d,
+                {(nx, ny)},
+                params["lookahead_depth"], k
+            )
+
+        if self.scoring == "learned" and leaves:
+            scores = self.evaluator.evaluate(board, leaves, [*blocked, own_head], (other_x, other_y))
+        else:
+            scores = [evaluate(x, y, occ) for x, y, occ in leaves]
+
+        # a move is worth its best leaf, a move without any runs into a wall before the end of the lookahead
+        move_scores = [-999999] * len(moves)
+        for root, score in zip(roots, scores):
+            if score > move_scores[root]:
+                move_scores[root] = score
+
+        best_dir = None
+        best_score = -999999
+
+        for d, score in zip(moves, move_scores):
+            if score > best_score:
+                best_score = score
+                best_dir = d
+
+        if best_dir:
+            self.direction = best_dir
+
+    def isAlive( self, board, heads ):
+        # heads counts the players on each head cell, players sharing a cell all die
+        if not board.isFree( self.x, self.y ) or heads[(self.x, self.y)] > 1:
+            self.is_alive = False
+
+    def getPossibleCells( self ):
+        dx, dy = DIRECTIONS[self.heading]
+        return (
+            (self.x, self.y),
+            (self.x+dx, self.y+dy)
+        )
+
+    def reset( self, x=None, y=None, direction=None ):
+        if x is not None:
+            self.start_pos = (x, y)
+            self.start_direction = tuple( direction )
+        # emptied in place, the array keeps its memory for the next match
+        del self.trail[:]
+        self.x = self.start_pos[0]
+        self.y = self.start_pos[1]
+        self.heading = DIRECTION_CODES[self.start_direction]
+        self.is_alive = True
+        self.think_cooldown = 0
+        self.separated = False
+        if self.filler is not None:
+            self.filler.last_heads = None
+
+    def getPos( self ):
+        return (self.x, self.y)
+
+
+def startPositions( width, height, count ):
+    # two players face each other, more are spread on an ellipse and all turn the same way around it
+    if count == 2:
+        return [
+            (width * 3 // 16, height // 2, (1, 0)),
+            (width - width * 3 // 16, height // 2, (-1, 0))
+        ]
+    starts = []
+    for i in range( count ):
+        angle = 2 * math.pi * i / count
+        x = width // 2 + round( width * 5 / 16 * math.cos( angle ) )
+        y = height // 2 + round( height * 5 / 16 * math.sin( angle ) )
+        tx, ty = -math.sin( angle ), math.cos( angle )
+        direction = ( 1 if tx > 0 else -1, 0 ) if abs( tx ) >= abs( ty ) else ( 0, 1 if ty > 0 else -1 )
+        starts.append( (x, y, direction) )
+    return starts
+
+
+class TronGame:
+    def __init__( self, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None, random_start=False, player_count=2 ):
+        self.board = Board( width, height )
+        self.random_start = random_start
+        self.players = [
+            Player( x, y, direction, i + 1, width, height )
+            for i, ( x, y, direction ) in enumerate( startPositions( width, height, player_count ) )
+        ]
+        self.reset( seed )
+
+    def reset( self, seed=None ):
+        self.seed = seed
+        self.rng = random.Random( seed )
+        self.board.clear()
+        self.tick = 0
+        # None while the match runs, then 0 for an egality or the number of the winner
+        self.result = None
+
+        width, height = self.board.width, self.board.height
+        if self.random_start and len( self.players ) != 2:
+            # anywhere, at least a few cells away from everybody else
+            taken = []
+            for player in self.players:
+                while True:
+                    x = self.rng.randrange( 2, width - 2 )
+                    y = self.rng.randrange( 2, height - 2 )
+                    if all( abs( x - ox ) + abs( y - oy ) > 4 for ox, oy in taken ):
+                        break
+                taken.append( (x, y) )
+                player.reset( x, y, self.rng.choice( DIRECTIONS ) )
+        elif self.random_start:
+            # mirrored start so neither side gets an advantage
+            x = self.rng.randrange( 1, width // 2 - 1 )
+            y = self.rng.randrange( 1, height - 1 )
+            direction = self.rng.choice( [[1, 0], [0, 1], [0, -1]] )
+            self.players[0].reset( x, y, direction )
+            self.players[1].reset( width - 1 - x, y, [-direction[0], direction[1]] )
+        else:
+            for player in self.players:
+                player.reset()
+
+        for player in self.players:
+            player.rng.seed( self.rng.random() )
+        return self.getState()
+
+    def opponents( self, index ):
+        player = self.players[index]
+        return [ other for other in self.players if other is not player and other.is_alive ]
+
+    def think( self, index, difficulty, reaction_ticks=0 ):
+        player = self.players[index]
+        player.updateBot( difficulty, self.board, self.opponents( index ), reaction_ticks )
+        return player.direction
+
+    def step( self, actions ):
+        if self.result is not None:
+            return self.getState()
+
+        alive = [ player for player in self.players if player.is_alive ]
+        for player, action in zip( self.players, actions ):
+            if action is not None and player.is_alive:
+                player.turn( action )
+
+        # every old head becomes trail first, so swapping cells is a crash like any other
+        for player in alive:
+            player.update( self.board )
+
+        # one pass to count the players on each new head, one pass to check them, O(N) a tick
+        heads = {}
+        for player in alive:
+            pos = player.getPos()
+            heads[pos] = heads.get( pos, 0 ) + 1
+        for player in alive:
+            player.isAlive( self.board, heads )
+        self.tick += 1
+
+        survivors = [ player for player in alive if player.is_alive ]
+        if not survivors:
+            self.result = 0
+        elif len( survivors ) == 1 and len( self.players ) > 1:
+            self.result = survivors[0].player
+        return self.getState()
+
+    def getState( self ):
+        return {
+            "tick": self.tick,
+            "result": self.result,
+            "players": [
+                {
+                    "pos": player.getPos(),
+                    "direction": player.direction,
+                    "alive": player.is_alive
+                }
+                for player in self.players
+            ]
+        }
@@ -0,0 +1,311 @@
+import argparse
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# learned evaluation of the lookahead leaves ("bot:3:learned")
+# the lookahead gives all its leaves at once, they are scored in one batch: the walls in a window
+# around every leaf (board, other heads and their next cell, the path that led there) and where the
+# closest opponent is, then a linear model or a small mlp (relu), in plain numpy
+# the weights come from MODEL_FILE, trained on the samples of "python tron.py --dataset" to score the
+# move the winners played above the other moves they had:
+#   python tron.py --fit data/ --hidden 32
+# a leaf of the lookahead and a sample after one of its moves are the same kind of position, the head
+# just left is a wall and the new one is not
+
+MODEL_FILE = "evaluator.npz"
+RADIUS = 8
+L2 = 1e-4
+LEARNING_RATE = 0.003
+MOMENTUM = 0.9
+MINIBATCH = 256
+# engine.DIRECTIONS, the engine imports this module
+DIRECTION_STEPS = ( (1, 0), (0, 1), (-1, 0), (0, -1) )
+
+
+def featureRows( boards, board_index, xs, ys, other_xs, other_ys, radius, walls=None ):
+    # one row of features per position: window of walls around (xs, ys) on boards[board_index], then
+    # the offset to the opponent and its distance, scaled by the board size
+    # walls are extra (row, x, y) wall cells, the ones outside the window are ignored
+    count, height, width = boards.shape
+    offsets = np.arange( -radius, radius + 1 )
+    wy = ys[:, None, None] + offsets[None, :, None]
+    wx = xs[:, None, None] + offsets[None, None, :]
+    inside = ( wy >= 0 ) & ( wy < height ) & ( wx >= 0 ) & ( wx < width )
+    cells = boards[board_index[:, None, None], np.clip( wy, 0, height - 1 ), np.clip( wx, 0, width - 1 )]
+    window = np.where( inside, cells != 0, True )
+    if walls is not None:
+        rows, wall_xs, wall_ys = walls
+        dx = wall_xs - xs[rows] + radius
+        dy = wall_ys - ys[rows] + radius
+        keep = ( dx >= 0 ) & ( dx <= 2 * radius ) & ( dy >= 0 ) & ( dy <= 2 * radius )
+        window[rows[keep], dy[keep], dx[keep]] = True
+    dx = ( other_xs - xs ) / width
+    dy = ( other_ys - ys ) / height
+    return np.concatenate(
+        ( window.reshape( len( xs ), -1 ), np.stack( ( dx, dy, np.abs( dx ) + np.abs( dy ) ), axis=1 ) ),
+        axis=1, dtype=np.float32
+    )
+
+
+class LearnedEvaluator:
+    # layers are (W, b), mean and scale standardize the features before the first one
+    def __init__( self, layers, mean, scale, radius=RADIUS ):
+        self.layers = layers
+        self.mean = mean
+        self.scale = scale
+        self.radius = radius
+
+    def forward( self, features ):
+        x = ( features - self.mean ) / self.scale
+        for k, ( weights, bias ) in enumerate( self.layers ):
+            x = x @ weights + bias
+            if k < len( self.layers ) - 1:
+                np.maximum( x, 0, out=x )
+        return x[:, 0]
+
+    def evaluate( self, board, leaves, walls, other ):
+        # scores of the leaves [(x, y, path)], path holds the cells of the lookahead up to the leaf,
+        # walls are cells that are not on the board yet but will be taken (own head, other players)
+        cells = np.frombuffer( board.cells, dtype=np.uint8 ).reshape( 1, board.height, board.width )
+        count = len( leaves )
+        xs = np.fromiter( ( x for x, _, _ in leaves ), dtype=np.int64, count=count )
+        ys = np.fromiter( ( y for _, y, _ in leaves ), dtype=np.int64, count=count )
+        rows = []
+        wall_xs = []
+        wall_ys = []
+        for row, ( x, y, path ) in enumerate( leaves ):
+            for cx, cy in path:
+                if cx != x or cy != y:
+                    rows.append( row )
+                    wall_xs.append( cx )
+                    wall_ys.append( cy )
+            for cx, cy in walls:
+                rows.append( row )
+                wall_xs.append( cx )
+                wall_ys.append( cy )
+        features = featureRows(
+            cells, np.zeros( count, dtype=np.int64 ), xs, ys,
+            np.full( count, other[0] ), np.full( count, other[1] ), self.radius,
+            ( np.array( rows, dtype=np.int64 ), np.array( wall_xs, dtype=np.int64 ), np.array( wall_ys, dtype=np.int64 ) )
+        )
+        return self.forward( features )
+
+    def save( self, path ):
+        arrays = { "radius": np.array( self.radius ), "mean": self.mean, "scale": self.scale }
+        for k, ( weights, bias ) in enumerate( self.layers ):
+            arrays[f"W{k}"] = weights
+            arrays[f"b{k}"] = bias
+        with open( path, "wb" ) as f:
+            np.savez( f, **arrays )
+
+
+# one model per file and process, every bot of the process shares it
+models = {}
+
+
+def evaluatorProblem( path=MODEL_FILE ):
+    # why "learned" bots can not play, None when they can, checked before a match starts
+    if np is None:
+        return "the learned evaluation needs numpy (pip install numpy)"
+    if not os.path.exists( path ):
+        return f"no model at {path}, train one first with python tron.py --fit <dataset directory>"
+    return None
+
+
+def loadEvaluator( path=MODEL_FILE ):
+    problem = evaluatorProblem( path ) if path not in models else None
+    if problem is not None:
+        raise RuntimeError( problem )
+    model = models.get( path )
+    if model is None:
+        with np.load( path ) as data:
+            layers = []
+            while f"W{len( layers )}" in data:
+                layers.append( ( data[f"W{len( layers )}"], data[f"b{len( layers )}"] ) )
+            model = models[path] = LearnedEvaluator( layers, data["mean"], data["scale"], int( data["radius"] ) )
+    return model
+
+
+def moveFeatures( shard, moves, radius ):
+    # features of the positions after moves[k] for every sample k
+    boards = shard["boards"]
+    count = len( boards )
+    rows = np.arange( count )
+    player = shard["player"].astype( np.int64 )
+    heads = shard["heads"].astype( np.int64 )
+    alive = shard["alive"]
+    steps = np.array( DIRECTION_STEPS, dtype=np.int64 )
+    me = heads[rows, player]
+    xs = me[:, 0] + steps[moves, 0]
+    ys = me[:, 1] + steps[moves, 1]
+
+    # closest opponent alive, the sample itself when there is none (as the bot does)
+    others = alive.copy()
+    others[rows, player] = False
+    distance = np.abs( heads[:, :, 0] - me[:, None, 0] ) + np.abs( heads[:, :, 1] - me[:, None, 1] )
+    closest = np.where( others.any( axis=1 ), np.where( others, distance, np.iinfo( np.int64 ).max ).argmin( axis=1 ), player )
+    other = heads[rows, closest]
+
+    # own head, other heads and the cell in front of them
+    ahead = heads + steps[shard["headings"].astype( np.int64 )]
+    wall_rows = [ rows ]
+    wall_xs = [ me[:, 0] ]
+    wall_ys = [ me[:, 1] ]
+    for p in range( heads.shape[1] ):
+        mask = others[:, p]
+        for cells in ( heads[:, p], ahead[:, p] ):
+            wall_rows.append( rows[mask] )
+            wall_xs.append( cells[mask, 0] )
+            wall_ys.append( cells[mask, 1] )
+    walls = ( np.concatenate( wall_rows ), np.concatenate( wall_xs ), np.concatenate( wall_ys ) )
+    return featureRows( boards, rows, xs, ys, other[:, 0], other[:, 1], radius, walls )
+
+
+def candidateFeatures( shard, radius ):
+    # (features, legal, choice) of the samples of the match winners with more than one free move
+    # features[k, j] is the position after the j-th move (ahead, left, right), choice the one played
+    winners = shard["outcome"] == 1
+    shard = { name: values[winners] for name, values in shard.items() }
+    boards = shard["boards"]
+    count, height, width = boards.shape
+    rows = np.arange( count )
+    player = shard["player"].astype( np.int64 )
+    me = shard["heads"].astype( np.int64 )[rows, player]
+    heading = shard["headings"][rows, player].astype( np.int64 )
+    steps = np.array( DIRECTION_STEPS, dtype=np.int64 )
+    features = []
+    legal = []
+    choice = np.zeros( count, dtype=np.int64 )
+    for j, turn in enumerate( ( 0, 1, 3 ) ):
+        moves = ( heading + turn ) & 3
+        xs = me[:, 0] + steps[moves, 0]
+        ys = me[:, 1] + steps[moves, 1]
+        free = ( xs >= 0 ) & ( xs < width ) & ( ys >= 0 ) & ( ys < height )
+        free[free] &= boards[rows[free], ys[free], xs[free]] == 0
+        features.append( moveFeatures( shard, moves, radius ) )
+        legal.append( free )
+        choice[shard["move"] == moves] = j
+    legal = np.stack( legal, axis=1 )
+    keep = legal.sum( axis=1 ) > 1
+    return np.stack( features, axis=1 )[keep], legal[keep], choice[keep]
+
+
+def choiceGradients( layers, x, legal, choice ):
+    # softmax over the legal moves of every sample, returns the gradients of the cross entropy with the
+    # move played, its mean and how often the best scored move is that one
+    count, moves, size = x.shape
+    activations = [ x.reshape( count * moves, size ) ]
+    for k, ( weights, bias ) in enumerate( layers ):
+        out = activations[-1] @ weights + bias
+        if k < len( layers ) - 1:
+            np.maximum( out, 0, out=out )
+        activations.append( out )
+    scores = np.where( legal, activations[-1].reshape( count, moves ), -np.inf )
+    scores -= scores.max( axis=1, keepdims=True )
+    probabilities = np.exp( scores )
+    probabilities /= probabilities.sum( axis=1, keepdims=True )
+    rows = np.arange( count )
+    loss = float( -np.log( np.maximum( probabilities[rows, choice], 1e-12 ) ).mean() )
+    right = int( ( probabilities.argmax( axis=1 ) == choice ).sum() )
+
+    grad = probabilities
+    grad[rows, choice] -= 1
+    grad = ( grad / count ).reshape( count * moves, 1 ).astype( np.float32 )
+    grads = [None] * len( layers )
+    for k in range( len( layers ) - 1, -1, -1 ):
+        weights, _ = layers[k]
+        grads[k] = ( activations[k].T @ grad + L2 * weights, grad.sum( axis=0 ) )
+        if k:
+            grad = ( grad @ weights.T ) * ( activations[k] > 0 )
+    return grads, loss, right
+
+
+def fit( directory, hidden=0, epochs=3, radius=RADIUS, seed=0, on_epoch=None ):
+    # comparison training: the move the winner of a match played should get the best score of the moves
+    # it had, so the model learns to rank positions the way the winning bots of the dataset do
+    # hidden 0 is a linear model, otherwise one relu layer, sgd with momentum on both
+    # the shards are read one at a time, memory does not grow with the dataset
+    # (dataset imports the engine, which imports this module)
+    from dataset import readShards
+
+    rng = np.random.default_rng( seed )
+    total = None
+    squares = None
+    count = 0
+    for shard in readShards( directory ):
+        features, legal, _ = candidateFeatures( shard, radius )
+        features = features[legal]
+        total = features.sum( axis=0, dtype=np.float64 ) + ( 0 if total is None else total )
+        squares = ( features.astype( np.float64 ) ** 2 ).sum( axis=0 ) + ( 0 if squares is None else squares )
+        count += len( features )
+    if not count:
+        raise ValueError( f"no decision of a winner with more than one move in {directory}" )
+    mean = ( total / count ).astype( np.float32 )
+    scale = np.sqrt( np.maximum( squares / count - mean.astype( np.float64 ) ** 2, 0 ) ).astype( np.float32 )
+    scale[scale < 1e-6] = 1
+    size = len( mean )
+
+    if hidden:
+        layers = [
+            ( ( rng.standard_normal( ( size, hidden ) ) * np.sqrt( 2 / size ) ).astype( np.float32 ), np.zeros( hidden, dtype=np.float32 ) ),
+            ( ( rng.standard_normal( ( hidden, 1 ) ) * np.sqrt( 1 / hidden ) ).astype( np.float32 ), np.zeros( 1, dtype=np.float32 ) )
+        ]
+    else:
+        layers = [ ( np.zeros( ( size, 1 ), dtype=np.float32 ), np.zeros( 1, dtype=np.float32 ) ) ]
+    velocity = [ ( np.zeros_like( weights ), np.zeros_like( bias ) ) for weights, bias in layers ]
+
+    for epoch in range( epochs ):
+        loss = 0.0
+        right = 0
+        decisions = 0
+        for shard in readShards( directory ):
+            features, legal, choice = candidateFeatures( shard, radius )
+            x_all = ( features - mean ) / scale
+            order = rng.permutation( len( x_all ) )
+            for start in range( 0, len( order ), MINIBATCH ):
+                batch = order[start:start + MINIBATCH]
+                grads, batch_loss, batch_right = choiceGradients( layers, x_all[batch], legal[batch], choice[batch] )
+                loss += batch_loss * len( batch )
+                right += batch_right
+                decisions += len( batch )
+                for ( weights, bias ), ( grad_w, grad_b ), ( vel_w, vel_b ) in zip( layers, grads, velocity ):
+                    vel_w *= MOMENTUM
+                    vel_w -= LEARNING_RATE * grad_w
+                    vel_b *= MOMENTUM
+                    vel_b -= LEARNING_RATE * grad_b
+                    weights += vel_w
+                    bias += vel_b
+        if on_epoch is not None:
+            on_epoch( epoch, loss / max( decisions, 1 ), right / max( decisions, 1 ) )
+    return LearnedEvaluator( layers, mean, scale, radius )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --fit", description="train the learned evaluation on a self-play dataset" )
+    parser.add_argument( "--fit", metavar="DIRECTORY", required=True, help="made by python tron.py --dataset" )
+    parser.add_argument( "--hidden", type=int, default=0, help="units of the hidden layer, 0 for a linear model" )
+    parser.add_argument( "--epochs", type=int, default=3 )
+    parser.add_argument( "--radius", type=int, default=RADIUS, help="half size of the window of walls" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--output", default=MODEL_FILE )
+    args = parser.parse_args( argv )
+    if np is None:
+        parser.error( "numpy is needed (pip install numpy)" )
+
+    def progress( epoch, loss, right ):
+        print( f"epoch {epoch + 1}: cross entropy {loss:.4f}, move played ranked first {right:.1%}" )
+
+    try:
+        model = fit( args.fit, args.hidden, args.epochs, args.radius, args.seed, progress )
+    except ValueError as error:
+        parser.error( str( error ) )
+    model.save( args.output )
+    print( f"model written in {args.output}" )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+from time import perf_counter
+
+from engine import TronGame, SCORING
+from replay import ReplayWriter
+from evaluator import evaluatorProblem
+
+# hard stop for matches where both bots keep circling forever
+MAX_TICKS = 20000
+
+
+def parsePlayer( spec ):
+    # "bot:3" -> (3, "space"), "bot:3:territory" -> (3, "territory"), only bots can play without a window
+    kind, _, rest = spec.partition( ":" )
+    difficulty, _, scoring = rest.partition( ":" )
+    if kind != "bot" or not difficulty.isdigit() or scoring not in ( "", "space", "territory", "learned" ):
+        raise argparse.ArgumentTypeError( f"expected bot:<difficulty>[:space|territory|learned], got {spec}" )
+    if scoring == "learned":
+        # found now rather than on the first decision of the bot, in the middle of a match
+        problem = evaluatorProblem()
+        if problem is not None:
+            raise argparse.ArgumentTypeError( f"{spec}: {problem}" )
+    return int( difficulty ), scoring or SCORING
+
+
+def playMatch( game, difficulties, seed, max_ticks=MAX_TICKS, record_path=None ):
+    game.reset( seed )
+    recorder = None
+    if record_path is not None:
+        players = { f"player{i+1}": {"bot": True, "difficulty": difficulty} for i, difficulty in enumerate( difficulties ) }
+        recorder = ReplayWriter( record_path, game, players )
+    while game.result is None and game.tick < max_ticks:
+        actions = [ game.think( i, difficulty ) for i, difficulty in enumerate( difficulties ) ]
+        game.step( actions )
+        if recorder is not None:
+            recorder.record()
+    if recorder is not None:
+        recorder.close()
+    return ( game.result if game.result is not None else 0 ), game.tick
+
+
+def runMatches( difficulties, games, seed=0, random_start=False, scorings=None, record_directory=None ):
+    game = TronGame( random_start=random_start, player_count=len( difficulties ) )
+    if scorings is not None:
+        for player, scoring in zip( game.players, scorings ):
+            player.scoring = scoring
+    results = [0] * ( len( difficulties ) + 1 )
+    ticks = 0
+    start = perf_counter()
+    for i in range( games ):
+        record_path = None
+        if record_directory is not None:
+            os.makedirs( record_directory, exist_ok=True )
+            record_path = os.path.join( record_directory, f"{seed + i}.trr" )
+        result, match_ticks = playMatch( game, difficulties, seed + i, record_path=record_path )
+        results[result] += 1
+        ticks += match_ticks
+    return results, ticks, perf_counter() - start
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --headless", description="play bot matches without a window" )
+    parser.add_argument( "--headless", action="store_true" )
+    parser.add_argument( "--games", type=int, default=100 )
+    parser.add_argument( "--p1", type=parsePlayer, default=(3, SCORING) )
+    parser.add_argument( "--p2", type=parsePlayer, default=(3, SCORING) )
+    parser.add_argument( "--players", type=lambda specs: [ parsePlayer( spec ) for spec in specs.split( "," ) ],
+                         help="free for all, replaces --p1 / --p2, e.g. bot:2,bot:3,bot:4:territory" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--random-start", action="store_true", help="random start positions, mirrored for two players" )
+    parser.add_argument( "--record", metavar="DIRECTORY", help="save a replay of every match" )
+    args = parser.parse_args( argv )
+
+    players = args.players or [args.p1, args.p2]
+    difficulties = [ difficulty for difficulty, _ in players ]
+    scorings = [ scoring for _, scoring in players ]
+    results, ticks, elapsed = runMatches( difficulties, args.games, args.seed, args.random_start, scorings, args.record )
+    games = max( args.games, 1 )
+    print( f"games: {args.games}" )
+    for i, ( difficulty, scoring ) in enumerate( players ):
+        print( f"player {i+1} (bot:{difficulty}:{scoring}): {results[i+1]} wins ({results[i+1] / games:.1%})" )
+    print( f"egality: {results[0]} ({results[0] / games:.1%})" )
+    print( f"ticks: {ticks} in {elapsed:.2f}s ({ticks / max( elapsed, 1e-9 ):.0f} ticks/sec)" )
+
+
+if __name__ == "__main__":
+    main()
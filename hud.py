@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from time import perf_counter
+
+import pygame
+
+# text drawn over the game
+#   TextCache           a text is rendered once for a (text, color) and reused every frame after
+#   PerformanceOverlay  fps, ticks per second, bot decision times and trail lengths, the surface is
+#                       only rebuilt every REFRESH seconds, the other frames reuse it as it is
+
+TEXT_CACHE_SIZE = 256
+REFRESH = 0.5
+OVERLAY_BACKGROUND = (0, 0, 0, 170)
+OVERLAY_MARGIN = 6
+
+
+class TextCache:
+    def __init__( self, font, size=TEXT_CACHE_SIZE ):
+        self.font = font
+        self.size = size
+        self.surfaces = OrderedDict()
+
+    def render( self, text, color ):
+        key = ( text, color )
+        surface = self.surfaces.get( key )
+        if surface is None:
+            surface = self.surfaces[key] = self.font.render( text, True, color )
+            if len( self.surfaces ) > self.size:
+                self.surfaces.popitem( last=False )
+        else:
+            self.surfaces.move_to_end( key )
+        return surface
+
+
+class PerformanceOverlay:
+    def __init__( self, font, profiler, color, position=(10, 10) ):
+        self.font = font
+        self.profiler = profiler
+        self.color = color
+        self.position = position
+        self.visible = False
+        self.surface = None
+        # changes with every rebuilt surface, the renderers only redraw the overlay when it changes
+        self.key = 0
+        self.last_refresh = perf_counter()
+        self.frames = 0
+        self.last_tick = 0
+
+    def toggle( self ):
+        self.visible = not self.visible
+        self.surface = None
+
+    def lines( self, game, names, elapsed ):
+        ticks = max( 0, game.tick - self.last_tick )
+        lines = [ f"{self.frames / elapsed:.0f} fps   {ticks / elapsed:.0f} ticks/s   tick {game.tick}" ]
+        for i, player in enumerate( game.players ):
+            line = f"{names[i]}: {len( player.trail )} cells"
+            samples = self.profiler.samples.get( f"bot{i+1} think" )
+            if samples:
+                ordered = sorted( samples )
+                average = self.profiler.totals[f"bot{i+1} think"] / self.profiler.counts[f"bot{i+1} think"]
+                p99 = ordered[int( ( len( ordered ) - 1 ) * 0.99 )]
+                line += f"   think {samples[-1]*1000:.2f} / {average*1000:.2f} / {p99*1000:.2f} ms (last / avg / p99)"
+            lines.append( line )
+        return lines
+
+    def update( self, game, names ):
+        # called once per frame, returns the (surface, position) to draw, if any
+        self.frames += 1
+        now = perf_counter()
+        elapsed = now - self.last_refresh
+        if self.visible and ( self.surface is None or elapsed >= REFRESH ):
+            lines = [ self.font.render( line, True, self.color ) for line in self.lines( game, names, max( elapsed, 1e-9 ) ) ]
+            width = max( line.get_width() for line in lines ) + 2 * OVERLAY_MARGIN
+            height = sum( line.get_height() for line in lines ) + 2 * OVERLAY_MARGIN
+            self.surface = pygame.Surface( ( width, height ), pygame.SRCALPHA )
+            self.surface.fill( OVERLAY_BACKGROUND )
+            y = OVERLAY_MARGIN
+            for line in lines:
+                self.surface.blit( line, ( OVERLAY_MARGIN, y ) )
+                y += line.get_height()
+            self.key += 1
+        if elapsed >= REFRESH:
+            self.last_refresh = now
+            self.frames = 0
+            self.last_tick = game.tick
+        if not self.visible:
+            return None
+        return ( self.surface, self.position )
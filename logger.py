@@ -0,0 +1,131 @@
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from time import time
+
+# buffered logger for debugPrint
+# messages under the minimum level are dropped before any formatting, the others are kept in a
+# bounded buffer and written in batches by a background thread so the game loop never touches the disk
+
+DEFAULT_LOG_SETTINGS = {
+    "level": 2,
+    "max_bytes": 1000000,
+    "backups": 3,
+    "jsonl": False
+}
+
+
+class Logger:
+    def __init__( self, path, level=DEFAULT_LOG_SETTINGS["level"], buffer_size=4096, flush_interval=0.5 ):
+        self.path = path
+        self.jsonl_path = os.path.splitext( path )[0] + ".jsonl"
+        self.level = level
+        self.max_bytes = DEFAULT_LOG_SETTINGS["max_bytes"]
+        self.backups = DEFAULT_LOG_SETTINGS["backups"]
+        self.jsonl = DEFAULT_LOG_SETTINGS["jsonl"]
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+        self.buffer = deque()
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.file = None
+        self.jsonl_file = None
+
+    def configure( self, log_settings ):
+        self.level = log_settings.get( "level", self.level )
+        self.max_bytes = log_settings.get( "max_bytes", self.max_bytes )
+        self.backups = log_settings.get( "backups", self.backups )
+        jsonl = log_settings.get( "jsonl", self.jsonl )
+        if jsonl and not self.jsonl and self.file is not None:
+            self.jsonl_file = open( self.jsonl_path, "w" )
+        self.jsonl = jsonl
+
+    def start( self ):
+        # a new log for every run, like the old debug.log
+        self.file = open( self.path, "w" )
+        self.file.write( f"LOG START -- {time()}\n" )
+        if self.jsonl:
+            self.jsonl_file = open( self.jsonl_path, "w" )
+        self.running = True
+        self.thread = threading.Thread( target=self.run, name="logger", daemon=True )
+        self.thread.start()
+        atexit.register( self.close )
+
+    def isEnabled( self, level ):
+        return level >= self.level
+
+    def log( self, msg, level, *args ):
+        if level < self.level:
+            return
+        text = str( msg ) % args if args else str( msg )
+        with self.lock:
+            if len( self.buffer ) >= self.buffer_size:
+                self.dropped += 1
+                return
+            self.buffer.append( (time(), level, text) )
+            if len( self.buffer ) >= self.buffer_size // 2:
+                self.wake.set()
+
+    def run( self ):
+        while self.running:
+            self.wake.wait( self.flush_interval )
+            self.wake.clear()
+            self.flush()
+
+    def flush( self ):
+        if self.file is None:
+            return
+        with self.lock:
+            records = self.buffer
+            dropped = self.dropped
+            self.buffer = deque()
+            self.dropped = 0
+        if not records and not dropped:
+            return
+
+        with self.write_lock:
+            if dropped:
+                records.append( (time(), 4, f"{dropped} log messages dropped, buffer full") )
+            self.file.write( "".join( f"level:{level} {text}\n" for _, level, text in records ) )
+            self.file.flush()
+            if self.jsonl_file is not None:
+                self.jsonl_file.write( "".join(
+                    json.dumps( {"t": round( t, 6 ), "level": level, "msg": text}, separators=(",", ":") ) + "\n"
+                    for t, level, text in records
+                ) )
+                self.jsonl_file.flush()
+            # each sink has its own size, the json lines are longer than the text ones
+            if self.file.tell() >= self.max_bytes:
+                self.file = self.rotate( self.file, self.path )
+            if self.jsonl_file is not None and self.jsonl_file.tell() >= self.max_bytes:
+                self.jsonl_file = self.rotate( self.jsonl_file, self.jsonl_path )
+
+    def rotate( self, file, path ):
+        # debug.log -> debug.log.1 -> ... -> debug.log.<backups>, the same for debug.jsonl
+        file.close()
+        for i in range( self.backups - 1, 0, -1 ):
+            if os.path.exists( f"{path}.{i}" ):
+                os.replace( f"{path}.{i}", f"{path}.{i + 1}" )
+        if self.backups > 0:
+            os.replace( path, f"{path}.1" )
+        return open( path, "w" )
+
+    def close( self ):
+        if self.thread is not None:
+            self.running = False
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        for f in ( self.file, self.jsonl_file ):
+            if f is not None:
+                f.close()
+        self.file = None
+        self.jsonl_file = None
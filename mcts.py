@@ -0,0 +1,304 @@
+import atexit
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+# monte carlo tree search for the bot
+# same turn order as the alpha-beta: the bot picks a move, the other player answers knowing it, then
+# both new heads are checked together
+# leaves are scored by fast playouts on a copy of the board, both players run greedy / random moves
+# until one of them is stuck or PLAYOUT_DEPTH ticks have passed
+# playouts go by batches of BATCH_SIZE leaves, picked with a virtual loss so a batch spreads over the
+# tree, and each batch runs on the worker pool (or right here with a single worker)
+# the tree is kept between ticks, the branch of the moves really played becomes the next root
+# every playout gets its own seed from the bot rng, so a decision does not depend on the workers
+
+EXPLORATION = 1.4
+PLAYOUT_DEPTH = 30
+BATCH_SIZE = 8
+# chance a playout move is the one with the most free neighbours instead of a random one
+GREEDY = 0.7
+# playouts that run out of depth are scored by the free cells around both heads in this radius
+CUTOFF_RADIUS = 3
+
+WIN = 1.0
+DRAW = 0.5
+LOSS = 0.0
+
+
+def freeMoves( cells, width, height, x, y, direction, other_head ):
+    dx, dy = direction
+    moves = []
+    for d in ( (dx, dy), (-dy, dx), (dy, -dx) ):
+        nx = x + d[0]
+        ny = y + d[1]
+        if 0 <= nx < width and 0 <= ny < height and cells[ny * width + nx] == 0 and (nx, ny) != other_head:
+            moves.append( d )
+    return moves
+
+
+def freeAround( cells, width, height, x, y ):
+    free = 0
+    for ny in range( max( 0, y - CUTOFF_RADIUS ), min( height, y + CUTOFF_RADIUS + 1 ) ):
+        start = ny * width
+        free += cells.count( 0, start + max( 0, x - CUTOFF_RADIUS ), start + min( width, x + CUTOFF_RADIUS + 1 ) )
+    return free
+
+
+def playout( cells, width, height, me, my_dir, other, other_dir, seed ):
+    # result for the bot between LOSS and WIN, cells is edited in place
+    rng = random.Random( seed )
+
+    def pick( moves, x, y ):
+        if len( moves ) > 1 and rng.random() < GREEDY:
+            return max( moves, key=lambda d: len( freeMoves( cells, width, height, x + d[0], y + d[1], d, None ) ) )
+        return rng.choice( moves )
+
+    for _ in range( PLAYOUT_DEPTH ):
+        my_moves = freeMoves( cells, width, height, me[0], me[1], my_dir, other )
+        their_moves = freeMoves( cells, width, height, other[0], other[1], other_dir, me )
+        if not my_moves and not their_moves:
+            return DRAW
+        if not my_moves:
+            return LOSS
+        if not their_moves:
+            return WIN
+        my_dir = pick( my_moves, me[0], me[1] )
+        other_dir = pick( their_moves, other[0], other[1] )
+        cells[me[1] * width + me[0]] = 1
+        cells[other[1] * width + other[0]] = 2
+        me = (me[0] + my_dir[0], me[1] + my_dir[1])
+        other = (other[0] + other_dir[0], other[1] + other_dir[1])
+        if me == other:
+            return DRAW
+    mine = freeAround( cells, width, height, me[0], me[1] )
+    theirs = freeAround( cells, width, height, other[0], other[1] )
+    return DRAW + 0.5 * ( mine - theirs ) / ( ( 2 * CUTOFF_RADIUS + 1 ) ** 2 )
+
+
+# worker side, the board of the decision is read from shared memory
+worker_shm = None
+
+
+def initWorker( shm_name ):
+    global worker_shm
+    worker_shm = SharedMemory( name=shm_name )
+
+
+def playoutTask( task ):
+    width, height, trail, me, my_dir, other, other_dir, seed = task
+    cells = bytearray( worker_shm.buf[:width * height] )
+    for i in trail:
+        cells[i] = 3
+    return playout( cells, width, height, me, my_dir, other, other_dir, seed )
+
+
+class Node:
+    # a bot node (the bot moves next) holds the position, its children are reply nodes (the other
+    # player answers a bot move), whose children are bot nodes again
+    __slots__ = (
+        "move", "children", "untried", "replies", "visits", "value", "me", "my_dir", "other", "other_dir", "result"
+    )
+
+    def __init__( self, move, me=None, my_dir=None, other=None, other_dir=None ):
+        self.move = move
+        self.children = []
+        self.untried = None
+        self.replies = None
+        self.visits = 0
+        # sum of the results, always seen from the bot
+        self.value = 0.0
+        self.me = me
+        self.my_dir = my_dir
+        self.other = other
+        self.other_dir = other_dir
+        # WIN / DRAW / LOSS when the game is over in this position
+        self.result = None
+
+
+class MonteCarloSearch:
+    def __init__( self, width, height, workers=1 ):
+        self.width = width
+        self.height = height
+        # 1 plays the playouts in this process, the caller decides (see Player.mcts_workers)
+        self.workers = workers
+        self.pool = None
+        self.shm = None
+        self.root = None
+        self.free = None
+        self.playouts = 0
+        self.reused = False
+        atexit.register( self.close )
+
+    def startPool( self ):
+        self.shm = SharedMemory( create=True, size=self.width * self.height )
+        self.pool = ProcessPoolExecutor( self.workers, initializer=initWorker, initargs=( self.shm.name, ) )
+
+    def close( self ):
+        if self.pool is not None:
+            self.pool.shutdown( cancel_futures=True )
+            self.pool = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def reuseRoot( self, board, me, my_dir, other, other_dir ):
+        # the grandchild reached by the moves played since the last decision, when the board only
+        # changed by the two old heads
+        free = board.cells.count( 0 )
+        root, last_free = self.root, self.free
+        self.root = None
+        self.free = free
+        if root is None or last_free - free != 2:
+            return None
+        for reply in root.children:
+            for child in reply.children:
+                if child.me == me and child.my_dir == my_dir and child.other == other and child.other_dir == other_dir:
+                    return child
+        return None
+
+    def select( self, root, cells, rng ):
+        # walks down to a new leaf, returns (path of nodes, trail cells, leaf)
+        width = self.width
+        path = [root]
+        trail = set()
+        node = root
+        while True:
+            if node.result is not None:
+                return path, trail, node
+            if node.untried is None:
+                node.untried = self.legal( cells, node, trail )
+                if node.result is not None:
+                    return path, trail, node
+            if node.untried:
+                # new bot move and a new reply under it, played out from there
+                move = node.untried.pop( rng.randrange( len( node.untried ) ) )
+                reply_node = Node( move )
+                reply_node.untried = list( node.replies )
+                node.children.append( reply_node )
+                path.append( reply_node )
+                return path, trail, self.expandReply( node, reply_node, trail, path, rng )
+            reply_node = self.best( node, True )
+            path.append( reply_node )
+            if reply_node.untried:
+                return path, trail, self.expandReply( node, reply_node, trail, path, rng )
+            child = self.best( reply_node, False )
+            trail.add( node.me[1] * width + node.me[0] )
+            trail.add( node.other[1] * width + node.other[0] )
+            path.append( child )
+            node = child
+
+    def legal( self, cells, node, trail ):
+        width, height = self.width, self.height
+        me, other = node.me, node.other
+        my_moves = [
+            d for d in freeMoves( cells, width, height, me[0], me[1], node.my_dir, other )
+            if ( me[1] + d[1] ) * width + me[0] + d[0] not in trail
+        ]
+        their_moves = [
+            d for d in freeMoves( cells, width, height, other[0], other[1], node.other_dir, me )
+            if ( other[1] + d[1] ) * width + other[0] + d[0] not in trail
+        ]
+        if not my_moves and not their_moves:
+            node.result = DRAW
+        elif not my_moves:
+            node.result = LOSS
+        elif not their_moves:
+            node.result = WIN
+        node.replies = their_moves
+        return my_moves
+
+    def expandReply( self, parent, reply_node, trail, path, rng ):
+        width = self.width
+        reply = reply_node.untried.pop( rng.randrange( len( reply_node.untried ) ) )
+        me = (parent.me[0] + reply_node.move[0], parent.me[1] + reply_node.move[1])
+        other = (parent.other[0] + reply[0], parent.other[1] + reply[1])
+        child = Node( reply, me, reply_node.move, other, reply )
+        if me == other:
+            # head on, both players die
+            child.result = DRAW
+        reply_node.children.append( child )
+        trail.add( parent.me[1] * width + parent.me[0] )
+        trail.add( parent.other[1] * width + parent.other[0] )
+        path.append( child )
+        return child
+
+    def best( self, node, maximize ):
+        # UCT, the bot takes the highest value, the other player the lowest
+        log_visits = math.log( max( node.visits, 1 ) )
+        best_score = None
+        best_child = None
+        for child in node.children:
+            if child.visits == 0:
+                return child
+            mean = child.value / child.visits
+            if not maximize:
+                mean = 1 - mean
+            score = mean + EXPLORATION * math.sqrt( log_visits / child.visits )
+            if best_score is None or score > best_score:
+                best_score = score
+                best_child = child
+        return best_child
+
+    def bestMove( self, board, me, my_dir, other, other_dir, playouts, rng ):
+        # most visited bot move after the given number of playouts, None when the bot cannot move
+        my_dir = tuple( my_dir )
+        other_dir = tuple( other_dir )
+        root = self.reuseRoot( board, me, my_dir, other, other_dir )
+        self.reused = root is not None
+        if root is None:
+            root = Node( None, me, my_dir, other, other_dir )
+        cells = board.cells
+        if self.workers > 1:
+            if self.pool is None:
+                self.startPool()
+            self.shm.buf[:len( cells )] = cells
+
+        done = 0
+        while done < playouts:
+            batch = []
+            for _ in range( min( BATCH_SIZE, playouts - done ) ):
+                path, trail, leaf = self.select( root, cells, rng )
+                # virtual loss for whoever picked each node, the next selections of the batch look elsewhere
+                # reply nodes are picked by the bot (a loss is 0), bot nodes by the other player (a loss is 1)
+                for k, node in enumerate( path ):
+                    node.visits += 1
+                    if k % 2 == 0 and k:
+                        node.value += WIN
+                batch.append( (path, trail, leaf, rng.getrandbits( 32 )) )
+            results = self.run( cells, batch )
+            for ( path, _, _, _ ), result in zip( batch, results ):
+                for k, node in enumerate( path ):
+                    node.value += result - ( WIN if k % 2 == 0 and k else 0 )
+            done += len( batch )
+            if root.result is not None:
+                break
+        self.playouts = done
+        self.root = root
+
+        if not root.children:
+            return None
+        return max( root.children, key=lambda child: child.visits ).move
+
+    def run( self, cells, batch ):
+        results = [ None ] * len( batch )
+        tasks = []
+        for k, ( _, trail, leaf, seed ) in enumerate( batch ):
+            if leaf.result is not None:
+                results[k] = leaf.result
+            else:
+                tasks.append( (k, ( self.width, self.height, sorted( trail ), leaf.me, leaf.my_dir, leaf.other, leaf.other_dir, seed )) )
+        if self.pool is not None:
+            outcomes = self.pool.map( playoutTask, [ task for _, task in tasks ] )
+        else:
+            outcomes = []
+            for _, ( width, height, trail, me, my_dir, other, other_dir, seed ) in tasks:
+                copy = bytearray( cells )
+                for i in trail:
+                    copy[i] = 3
+                outcomes.append( playout( copy, width, height, me, my_dir, other, other_dir, seed ) )
+        for ( k, _ ), outcome in zip( tasks, outcomes ):
+            results[k] = outcome
+        return results
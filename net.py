@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import random
+import struct
+from collections import deque
+from time import perf_counter
+
+from engine import TronGame, DIRECTIONS, DIRECTION_CODES
+
+# online matches, one asyncio server hosts every room
+# the server runs the only real simulation, clients send direction changes tagged with the tick they
+# are for and get back one byte per player and per tick (the heading), they replay the match from that
+# a client tags its inputs INPUT_DELAY ticks after the last tick it got, so they reach the server in
+# time for the tick they ask for and every player sees the turn at the same tick
+#
+# messages are a type byte and a fixed payload, network order
+#   client -> server
+#     JOIN   room H, players B      room size (1 to MAX_PLAYERS), the first client of a room decides it
+#     INPUT  tick I, heading B
+#     PING   time d                 sent back as is in a PONG
+#   server -> client
+#     START  index B, players B, width H, height H, seed I, tick rate B, input delay B
+#     TICK   tick I, heading B per player
+#     PONG   time d
+#     END    tick I, result B
+#
+#   python tron.py --serve --port 5555
+#   python tron.py --connect localhost:5555 --room 1
+#   python net.py --bots 20 --local            20 bot clients against a server in the same process
+
+JOIN = 1
+INPUT = 2
+PING = 3
+START = 10
+TICK = 11
+PONG = 12
+END = 13
+
+FORMATS = {
+    JOIN: struct.Struct( "!HB" ),
+    INPUT: struct.Struct( "!IB" ),
+    PING: struct.Struct( "!d" ),
+    START: struct.Struct( "!BBHHIBB" ),
+    PONG: struct.Struct( "!d" ),
+    END: struct.Struct( "!IB" )
+}
+TICK_HEADER = struct.Struct( "!I" )
+
+DEFAULT_PORT = 5555
+TICK_RATE = 30
+INPUT_DELAY = 2
+ARENA = (160, 120)
+# the most players a room can ask for, as many as a local match
+MAX_PLAYERS = 16
+# time between the start message and the first tick
+START_DELAY = 1.0
+PING_INTERVAL = 0.5
+MAX_TICKS = 20000
+# a client that does not read its messages is dropped before the server buffers too much for it
+MAX_WRITE_BUFFER = 1 << 16
+
+
+class LatencyStats:
+    # jitter is the mean difference between two following samples (as in rtp)
+    def __init__( self, size=1000 ):
+        self.samples = deque( maxlen=size )
+        self.jitter = 0.0
+
+    def add( self, sample ):
+        if self.samples:
+            self.jitter += ( abs( sample - self.samples[-1] ) - self.jitter ) / 16
+        self.samples.append( sample )
+
+    def summary( self, unit="ms", scale=1000 ):
+        if not self.samples:
+            return "no samples"
+        ordered = sorted( self.samples )
+        mean = sum( ordered ) / len( ordered ) * scale
+        p95 = ordered[int( ( len( ordered ) - 1 ) * 0.95 )] * scale
+        return f"mean {mean:.2f} {unit}, p95 {p95:.2f} {unit}, jitter {self.jitter * scale:.2f} {unit}"
+
+
+async def readMessage( reader, players=0 ):
+    # (type, values), the size of a TICK depends on the number of players
+    kind = ( await reader.readexactly( 1 ) )[0]
+    if kind == TICK:
+        data = await reader.readexactly( TICK_HEADER.size + players )
+        return kind, ( TICK_HEADER.unpack_from( data )[0], data[TICK_HEADER.size:] )
+    fmt = FORMATS.get( kind )
+    if fmt is None:
+        raise ValueError( f"unknown message type {kind}" )
+    return kind, fmt.unpack( await reader.readexactly( fmt.size ) )
+
+
+def packMessage( kind, *values ):
+    return bytes( (kind,) ) + FORMATS[kind].pack( *values )
+
+
+class Seat:
+    # one client in a room, its inputs wait here until the tick they were sent for
+    def __init__( self, writer ):
+        self.writer = writer
+        self.index = 0
+        self.inputs = deque()
+        self.connected = True
+        # how many ticks before its tick an input arrived, negative when it was late
+        self.margins = LatencyStats()
+        self.late = 0
+
+    def send( self, data ):
+        if not self.connected:
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.connected = False
+            self.writer.close()
+            return
+        self.writer.write( data )
+
+    def receive( self, tick, heading, current ):
+        if tick < current:
+            self.late += 1
+        self.margins.add( tick - current )
+        self.inputs.append( (max( tick, current ), heading) )
+
+    def action( self, tick ):
+        # one turn a tick, the ones sent for the same tick go on the next ones
+        if self.inputs and self.inputs[0][0] <= tick:
+            return DIRECTIONS[self.inputs.popleft()[1]]
+        return None
+
+
+class Room:
+    def __init__( self, number, players, server ):
+        self.number = number
+        self.players = players
+        self.server = server
+        self.seats = []
+        self.game = None
+
+    def join( self, writer ):
+        seat = Seat( writer )
+        seat.index = len( self.seats )
+        self.seats.append( seat )
+        return seat
+
+    def full( self ):
+        return len( self.seats ) >= self.players
+
+    def broadcast( self, data ):
+        for seat in self.seats:
+            seat.send( data )
+
+    async def run( self ):
+        server = self.server
+        seed = server.rng.getrandbits( 32 )
+        width, height = server.arena
+        game = self.game = TronGame( width, height, seed, True, self.players )
+        for seat in self.seats:
+            seat.send( packMessage( START, seat.index, self.players, width, height, seed, server.tick_rate, server.input_delay ) )
+
+        loop = asyncio.get_running_loop()
+        tick_length = 1 / server.tick_rate
+        next_tick = loop.time() + START_DELAY
+        while game.result is None and game.tick < MAX_TICKS and any( seat.connected for seat in self.seats ):
+            await asyncio.sleep( max( 0.0, next_tick - loop.time() ) )
+            next_tick += tick_length
+            game.step( [ seat.action( game.tick ) for seat in self.seats ] )
+            self.broadcast(
+                bytes( (TICK,) ) + TICK_HEADER.pack( game.tick ) + bytes( player.heading for player in game.players )
+            )
+        self.broadcast( packMessage( END, game.tick, game.result or 0 ) )
+        for seat in self.seats:
+            if seat.connected:
+                try:
+                    await seat.writer.drain()
+                except ConnectionError:
+                    pass
+        server.finished( self )
+
+
+class Server:
+    def __init__( self, tick_rate=TICK_RATE, input_delay=INPUT_DELAY, arena=ARENA, seed=None, on_finished=None ):
+        self.tick_rate = tick_rate
+        self.input_delay = input_delay
+        self.arena = arena
+        self.rng = random.Random( seed )
+        # rooms waiting for players, by number
+        self.waiting = {}
+        self.rooms = set()
+        self.on_finished = on_finished
+
+    async def handle( self, reader, writer ):
+        seat = None
+        try:
+            kind, values = await readMessage( reader )
+            if kind != JOIN:
+                return
+            number, players = values
+            room = self.waiting.get( number )
+            if room is None:
+                room = self.waiting[number] = Room( number, min( max( 1, players ), MAX_PLAYERS ), self )
+            seat = room.join( writer )
+            if room.full():
+                del self.waiting[number]
+                self.rooms.add( room )
+                asyncio.get_running_loop().create_task( room.run() )
+            while True:
+                kind, values = await readMessage( reader )
+                if kind == INPUT:
+                    tick, heading = values
+                    if room.game is not None and heading < len( DIRECTIONS ):
+                        seat.receive( tick, heading, room.game.tick )
+                elif kind == PING:
+                    seat.send( packMessage( PONG, *values ) )
+        except ( asyncio.IncompleteReadError, ConnectionError, ValueError ):
+            pass
+        finally:
+            if seat is not None:
+                seat.connected = False
+                if room.game is None and room.number in self.waiting:
+                    # left before the start, the seat goes to the next client
+                    room.seats.remove( seat )
+                    for index, other in enumerate( room.seats ):
+                        other.index = index
+            writer.close()
+
+    def finished( self, room ):
+        self.rooms.discard( room )
+        if self.on_finished is not None:
+            self.on_finished( room )
+
+    async def serve( self, host, port ):
+        server = await asyncio.start_server( self.handle, host, port )
+        async with server:
+            await server.serve_forever()
+
+
+class Client:
+    # replays the match from the server ticks on its own TronGame
+    def __init__( self, room, players ):
+        self.room = room
+        self.players = players
+        self.reader = None
+        self.writer = None
+        self.game = None
+        self.index = None
+        self.tick_rate = TICK_RATE
+        self.input_delay = INPUT_DELAY
+        self.result = None
+        self.rtt = LatencyStats()
+        # time between two ticks minus the tick length
+        self.tick_jitter = LatencyStats()
+        self.last_tick_time = None
+        self.started = asyncio.Event()
+        self.new_tick = asyncio.Event()
+        self.sent_heading = None
+
+    async def connect( self, host, port ):
+        self.reader, self.writer = await asyncio.open_connection( host, port )
+        self.writer.write( packMessage( JOIN, self.room, self.players ) )
+
+    def turn( self, direction ):
+        # asks for a direction, it is played INPUT_DELAY ticks after the last tick received
+        if self.game is None or self.result is not None:
+            return
+        heading = DIRECTION_CODES[tuple( direction )]
+        if heading == self.sent_heading:
+            return
+        self.sent_heading = heading
+        self.writer.write( packMessage( INPUT, self.game.tick + self.input_delay, heading ) )
+
+    async def ping( self ):
+        while self.result is None:
+            self.writer.write( packMessage( PING, perf_counter() ) )
+            await asyncio.sleep( PING_INTERVAL )
+
+    async def run( self, on_tick=None ):
+        pinger = asyncio.get_running_loop().create_task( self.ping() )
+        try:
+            while self.result is None:
+                kind, values = await readMessage( self.reader, len( self.game.players ) if self.game else 0 )
+                if kind == START:
+                    self.index, players, width, height, seed, self.tick_rate, self.input_delay = values
+                    self.game = TronGame( width, height, seed, True, players )
+                    self.sent_heading = self.game.players[self.index].heading
+                    self.started.set()
+                elif kind == TICK:
+                    tick, headings = values
+                    now = perf_counter()
+                    if self.last_tick_time is not None:
+                        self.tick_jitter.add( abs( now - self.last_tick_time - 1 / self.tick_rate ) )
+                    self.last_tick_time = now
+                    # headings are set as they are, whatever a local bot did with the players
+                    for player, heading in zip( self.game.players, headings ):
+                        player.heading = heading
+                    self.game.step( [None] * len( headings ) )
+                    if self.game.tick != tick:
+                        raise RuntimeError( f"out of sync, tick {self.game.tick} instead of {tick}" )
+                    self.new_tick.set()
+                    if on_tick is not None:
+                        on_tick( self )
+                elif kind == PONG:
+                    self.rtt.add( perf_counter() - values[0] )
+                elif kind == END:
+                    tick, self.result = values
+                    if self.game.tick != tick or ( self.game.result or 0 ) != self.result:
+                        raise RuntimeError( f"out of sync, the server ended at tick {tick} with {self.result}" )
+                    self.new_tick.set()
+        finally:
+            pinger.cancel()
+            self.writer.close()
+        return self.result
+
+
+def predictedThink( client, difficulty ):
+    # the move is played input_delay ticks from now, the bot thinks from where it will be by then
+    # (going on with the last direction it sent, the others stay where they are)
+    game = client.game
+    player = game.players[client.index]
+    board = game.board
+    saved = ( player.x, player.y, player.heading )
+    written = []
+    player.heading = client.sent_heading
+    # through Board.set, the summed-area table behind the space estimate of difficulty 2 / 3 has to see them
+    for _ in range( client.input_delay ):
+        dx, dy = player.direction
+        if not board.isFree( player.x + dx, player.y + dy ):
+            break
+        written.append( (player.x, player.y) )
+        board.set( player.x, player.y, player.player )
+        player.x += dx
+        player.y += dy
+    try:
+        return game.think( client.index, difficulty )
+    finally:
+        for x, y in written:
+            board.set( x, y, 0 )
+        player.x, player.y, player.heading = saved
+
+
+async def botClient( host, port, room, players, difficulty ):
+    # a client played by a local bot, for tests and load tests
+    client = Client( room, players )
+    await client.connect( host, port )
+
+    def think( client ):
+        if client.game.result is None and client.game.players[client.index].is_alive:
+            client.turn( predictedThink( client, difficulty ) )
+
+    await client.run( think )
+    return client
+
+
+async def loadTest( host, port, bots, players, difficulty, local ):
+    server_task = None
+    if local:
+        server = Server( on_finished=lambda room: print( f"room {room.number}: result {room.game.result} after {room.game.tick} ticks, "
+                                                         + ", ".join( f"player {seat.index + 1} {seat.late} late inputs" for seat in room.seats ) ) )
+        server_task = asyncio.get_running_loop().create_task( server.serve( host, port ) )
+        await asyncio.sleep( 0.1 )
+    start = perf_counter()
+    clients = await asyncio.gather( *(
+        botClient( host, port, i // players, players, difficulty ) for i in range( bots )
+    ) )
+    elapsed = perf_counter() - start
+    if server_task is not None:
+        server_task.cancel()
+
+    rtt = LatencyStats( 1 << 20 )
+    ticks = LatencyStats( 1 << 20 )
+    for client in clients:
+        for sample in client.rtt.samples:
+            rtt.add( sample )
+        for sample in client.tick_jitter.samples:
+            ticks.add( sample )
+    print( f"{bots} clients in {( bots + players - 1 ) // players} rooms, {elapsed:.2f}s" )
+    print( f"round trip: {rtt.summary()}" )
+    print( f"tick arrival, distance to the tick rate: {ticks.summary()}" )
+
+
+def parseAddress( address ):
+    host, _, port = address.rpartition( ":" )
+    return host or "localhost", int( port or DEFAULT_PORT )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --serve", description="online matches server, and bot clients to test it" )
+    parser.add_argument( "--serve", action="store_true" )
+    parser.add_argument( "--host", default="0.0.0.0" )
+    parser.add_argument( "--port", type=int, default=DEFAULT_PORT )
+    parser.add_argument( "--tick-rate", type=int, default=TICK_RATE )
+    parser.add_argument( "--input-delay", type=int, default=INPUT_DELAY, help="ticks between an input and its tick" )
+    parser.add_argument( "--seed", type=int, default=None )
+    parser.add_argument( "--bots", type=int, default=0, help="connect this many bot clients instead of serving" )
+    parser.add_argument( "--players", type=int, default=2, help="players per room for the bot clients" )
+    parser.add_argument( "--difficulty", type=int, default=2 )
+    parser.add_argument( "--local", action="store_true", help="start a server in the same process for the bot clients" )
+    args = parser.parse_args( argv )
+
+    if args.bots:
+        host = "localhost" if args.host == "0.0.0.0" else args.host
+        asyncio.run( loadTest( host, args.port, args.bots, args.players, args.difficulty, args.local ) )
+        return
+
+    def finished( room ):
+        print( f"room {room.number}: result {room.game.result} after {room.game.tick} ticks" )
+        for seat in room.seats:
+            print( f"  player {seat.index + 1}: {seat.late} late inputs, margin {seat.margins.summary( 'ticks', 1 )}" )
+
+    server = Server( args.tick_rate, args.input_delay, seed=args.seed, on_finished=finished )
+    print( f"listening on {args.host}:{args.port}" )
+    asyncio.run( server.serve( args.host, args.port ) )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+from time import perf_counter
+
+import pygame
+
+from net import Client, parseAddress
+from render import TrailRenderer, ViewportRenderer, Camera, SURFARRAY
+
+# window of an online match, the player steers with wasd or the arrows
+#   tab / [ / ]  camera on the next player / zoom out / zoom in
+# the frame loop runs on the asyncio loop, the network is read between two frames
+
+KEYS = {
+    pygame.K_w: (0, -1), pygame.K_UP: (0, -1),
+    pygame.K_a: (-1, 0), pygame.K_LEFT: (-1, 0),
+    pygame.K_s: (0, 1), pygame.K_DOWN: (0, 1),
+    pygame.K_d: (1, 0), pygame.K_RIGHT: (1, 0)
+}
+EXTRA_COLORS = [ (0, 200, 255), (255, 0, 255), (255, 150, 0), (150, 255, 150) ]
+
+
+def playOnline( screen, font, address, room, players, grid_size, fps, colors ):
+    asyncio.run( onlineLoop( screen, font, address, room, players, grid_size, fps, colors ) )
+
+
+async def onlineLoop( screen, font, address, room, players, grid_size, fps, colors ):
+    client = Client( room, players )
+    await client.connect( *parseAddress( address ) )
+    network = asyncio.get_running_loop().create_task( client.run() )
+    width, height = screen.get_size()
+    renderer = None
+    player_colors = []
+    running = True
+
+    while running:
+        frame_start = perf_counter()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                if event.key in KEYS:
+                    client.turn( KEYS[event.key] )
+                if renderer is not None and event.key == pygame.K_TAB:
+                    camera.cycle( len( player_colors ) )
+                if renderer is not None and event.key == pygame.K_LEFTBRACKET:
+                    camera.zoom( -1 )
+                if renderer is not None and event.key == pygame.K_RIGHTBRACKET:
+                    camera.zoom( 1 )
+
+        if network.done():
+            # the error of a lost connection is raised here
+            if network.exception() is not None:
+                raise network.exception()
+
+        game = client.game
+        if game is None:
+            screen.fill( colors["black"] )
+            text = font.render( f"room {room}, waiting for {players} players", True, colors["white"] )
+            screen.blit( text, (width // 2 - text.get_width() // 2, height // 4) )
+            pygame.display.flip()
+        else:
+            if renderer is None:
+                camera = Camera( game.board.width, game.board.height, width, height, grid_size )
+                if SURFARRAY:
+                    renderer = ViewportRenderer( screen, game.board, camera, colors["black"] )
+                else:
+                    renderer = TrailRenderer( screen, grid_size, colors["black"] )
+                # the own player always gets the color of player 1, and is the first one the camera follows
+                order = [client.index] + [ i for i in range( len( game.players ) ) if i != client.index ]
+                for slot, i in enumerate( order ):
+                    color = colors.get( f"player{slot+1}", EXTRA_COLORS[slot % len( EXTRA_COLORS )] )
+                    player_colors.append( (game.players[i], color) )
+
+            if client.result is None:
+                state = f"tick {game.tick}  ping {client.rtt.samples[-1] * 1000:.0f} ms" if client.rtt.samples else f"tick {game.tick}"
+            elif client.result == 0:
+                state = "egality"
+            else:
+                state = "you win" if client.result == client.index + 1 else f"player {client.result} win"
+            overlay = [ (font.render( state, True, colors["white"] ), (10, 10)) ]
+            renderer.render( player_colors, state, overlay )
+
+        # sleeps on the asyncio loop so the ticks keep coming while waiting for the next frame
+        await asyncio.sleep( max( 0.0, frame_start + 1 / fps - perf_counter() ) )
+
+    network.cancel()
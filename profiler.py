@@ -0,0 +1,138 @@
+import json
+import marshal
+import os
+from collections import deque
+from time import perf_counter
+
+# timing of every phase of a frame
+#   with profiler.span( "render" ):
+#       ...
+# each name keeps its last WINDOW durations for the percentiles, the last TRACE_SIZE spans are kept
+# with their start time for a chrome://tracing export, totals go to a file pstats can open
+
+WINDOW = 600
+TRACE_SIZE = 20000
+
+
+class Span:
+    # one per name, reused so timing a phase allocates nothing
+    def __init__( self, profiler, name ):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__( self ):
+        self.start = perf_counter()
+        return self
+
+    def __exit__( self, *exc ):
+        self.profiler.record( self.name, perf_counter() - self.start, self.start )
+        return False
+
+
+class NullSpan:
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    def __init__( self, enabled=True, window=WINDOW, trace_size=TRACE_SIZE ):
+        self.enabled = enabled
+        self.window = window
+        self.origin = perf_counter()
+        self.spans = {}
+        self.samples = {}
+        self.counts = {}
+        self.totals = {}
+        self.maxima = {}
+        self.trace = deque( maxlen=trace_size )
+
+    def span( self, name ):
+        if not self.enabled:
+            return NULL_SPAN
+        span = self.spans.get( name )
+        if span is None:
+            span = self.spans[name] = Span( self, name )
+        return span
+
+    def record( self, name, duration, start=None ):
+        # start is None for work timed elsewhere (a bot process), it is put just before now
+        if not self.enabled:
+            return
+        samples = self.samples.get( name )
+        if samples is None:
+            samples = self.samples[name] = deque( maxlen=self.window )
+            self.counts[name] = 0
+            self.totals[name] = 0.0
+            self.maxima[name] = 0.0
+        samples.append( duration )
+        self.counts[name] += 1
+        self.totals[name] += duration
+        if duration > self.maxima[name]:
+            self.maxima[name] = duration
+        # work timed elsewhere gets its own row in the trace
+        thread = 0
+        if start is None:
+            start = perf_counter() - duration
+            thread = 1
+        self.trace.append( (name, start, duration, thread) )
+
+    def stats( self ):
+        # percentiles over the rolling window, count / total / max over the whole session
+        stats = {}
+        for name, samples in self.samples.items():
+            ordered = sorted( samples )
+            last = len( ordered ) - 1
+            stats[name] = {
+                "count": self.counts[name],
+                "total": self.totals[name],
+                "p50": ordered[int( last * 0.5 )],
+                "p95": ordered[int( last * 0.95 )],
+                "p99": ordered[int( last * 0.99 )],
+                "max": self.maxima[name]
+            }
+        return stats
+
+    def report( self ):
+        lines = [ f"{'phase':<20} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}" ]
+        for name, s in sorted( self.stats().items(), key=lambda item: -item[1]["total"] ):
+            lines.append( f"{name:<20} {s['count']:>8} {s['p50']*1000:>8.3f} {s['p95']*1000:>8.3f} {s['p99']*1000:>8.3f} {s['max']*1000:>8.3f}" )
+        return "\n".join( lines )
+
+    def exportChromeTrace( self, path ):
+        # open with chrome://tracing or https://ui.perfetto.dev
+        events = []
+        for name, start, duration, thread in self.trace:
+            events.append( {
+                "name": name,
+                "ph": "X",
+                "ts": ( start - self.origin ) * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": thread
+            } )
+        with open( path, "w" ) as f:
+            json.dump( { "traceEvents": events, "displayTimeUnit": "ms" }, f )
+
+    def exportPstats( self, path ):
+        # same layout cProfile writes, "python -m pstats <path>" reads it
+        stats = {}
+        for name in self.samples:
+            count = self.counts[name]
+            total = self.totals[name]
+            stats[("tron", 0, name)] = ( count, count, total, total, {} )
+        with open( path, "wb" ) as f:
+            marshal.dump( stats, f )
+
+    def reset( self ):
+        self.samples.clear()
+        self.counts.clear()
+        self.totals.clear()
+        self.maxima.clear()
+        self.trace.clear()
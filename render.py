@@ -0,0 +1,168 @@
+import math
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# two renderers with the same reset / render calls
+#   TrailRenderer     trails are drawn once on a persistent background, each frame only adds the new cells
+#                     and pushes their rectangles to the window, the board has to fit in the window
+#   ViewportRenderer  the visible part of the board goes through a palette into an 8 bit surface with
+#                     surfarray and is scaled to the window in one blit, any board size, needs numpy
+# the camera decides which part of the board the viewport shows
+
+SURFARRAY = np is not None
+OTHER_COLOR = (150, 150, 150)
+MIN_CELL_SIZE = 1
+MAX_CELL_SIZE = 32
+# below this many pixels a cell, the heads get a marker so the players can still be found
+HEAD_MARKER_SCALE = 2
+
+
+class TrailRenderer:
+    def __init__( self, screen, grid_size, background_color ):
+        self.screen = screen
+        self.grid_size = grid_size
+        self.background_color = background_color
+        self.background = pygame.Surface( screen.get_size() )
+        self.reset()
+
+    def reset( self ):
+        # next frame is redrawn from scratch
+        self.background.fill( self.background_color )
+        self.drawn = {}
+        self.overlay_key = None
+        self.overlay_rects = []
+        self.full_redraw = True
+
+    def drawNewCells( self, player, color ):
+        length = len( player.trail )
+        drawn = self.drawn.get( player.player, 0 )
+        if drawn > length:
+            # the player was reset without telling the renderer
+            self.reset()
+            drawn = 0
+        rects = []
+        for x, y in player.trailCells( drawn ):
+            rect = pygame.Rect( x*self.grid_size, y*self.grid_size, self.grid_size, self.grid_size )
+            pygame.draw.rect( self.background, color, rect )
+            rects.append( rect )
+        self.drawn[player.player] = length
+        return rects
+
+    def render( self, players, overlay_key=None, overlay=() ):
+        # players is a list of (player, color), overlay a list of (surface, position) drawn on top
+        rects = []
+        for player, color in players:
+            rects += self.drawNewCells( player, color )
+
+        overlay_rects = [ surface.get_rect( topleft=position ) for surface, position in overlay ]
+        if self.full_redraw:
+            self.screen.blit( self.background, (0, 0) )
+            for surface, position in overlay:
+                self.screen.blit( surface, position )
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            if overlay_key != self.overlay_key:
+                # the old overlay is wiped and the new one drawn, only where they are
+                rects += self.overlay_rects + overlay_rects
+            if not rects:
+                return
+            for rect in rects:
+                self.screen.blit( self.background, rect, rect )
+            # new cells under the overlay stay under it, the whole overlay is put back on the background
+            # first, a translucent one blitted over its last copy would get darker every frame
+            redrawn = []
+            for ( surface, position ), rect in zip( overlay, overlay_rects ):
+                if rect.collidelist( rects ) != -1:
+                    self.screen.blit( self.background, rect, rect )
+                    self.screen.blit( surface, position )
+                    redrawn.append( rect )
+            pygame.display.update( rects + redrawn )
+        self.overlay_key = overlay_key
+        self.overlay_rects = overlay_rects
+
+
+class Camera:
+    # target None shows the whole board, otherwise the view follows that player at cell_size pixels a cell
+    def __init__( self, board_width, board_height, view_width, view_height, cell_size=5 ):
+        self.board_width = board_width
+        self.board_height = board_height
+        self.view_width = view_width
+        self.view_height = view_height
+        self.cell_size = cell_size
+        self.target = None
+
+    def cycle( self, count ):
+        # whole board -> player 1 -> ... -> player count -> whole board
+        if self.target is None:
+            self.target = 0
+        elif self.target + 1 < count:
+            self.target += 1
+        else:
+            self.target = None
+
+    def zoom( self, step ):
+        # +1 doubles the cells size, -1 halves it
+        self.cell_size = max( MIN_CELL_SIZE, min( MAX_CELL_SIZE, int( self.cell_size * 2 ** step ) ) )
+
+    def view( self, players ):
+        # (x, y, width, height) of the visible cells and the pixels per cell
+        if self.target is None or self.target >= len( players ):
+            scale = min( self.view_width / self.board_width, self.view_height / self.board_height )
+            return 0, 0, self.board_width, self.board_height, scale
+        player = players[self.target][0]
+        width = min( self.board_width, math.ceil( self.view_width / self.cell_size ) )
+        height = min( self.board_height, math.ceil( self.view_height / self.cell_size ) )
+        x = max( 0, min( player.x - width // 2, self.board_width - width ) )
+        y = max( 0, min( player.y - height // 2, self.board_height - height ) )
+        return x, y, width, height, self.cell_size
+
+
+class ViewportRenderer:
+    def __init__( self, screen, board, camera, background_color ):
+        self.screen = screen
+        self.camera = camera
+        self.background_color = background_color
+        # a view of the board, nothing is copied when the trails grow
+        self.grid = np.frombuffer( board.cells, dtype=np.uint8 ).reshape( board.height, board.width )
+        self.surface = None
+        self.reset()
+
+    def reset( self ):
+        self.last_key = None
+
+    def render( self, players, overlay_key=None, overlay=() ):
+        # players is a list of (player, color), overlay a list of (surface, position) drawn on top
+        x, y, width, height, scale = self.camera.view( players )
+        palette = [ self.background_color ] + [ OTHER_COLOR ] * 255
+        for player, color in players:
+            palette[player.player] = color
+        key = ( x, y, width, height, scale, overlay_key, tuple( len( player.trail ) for player, _ in players ) )
+        if key == self.last_key:
+            return
+        self.last_key = key
+
+        if self.surface is None or self.surface.get_size() != ( width, height ):
+            self.surface = pygame.Surface( ( width, height ), depth=8 )
+        self.surface.set_palette( palette )
+        pygame.surfarray.blit_array( self.surface, self.grid[y:y + height, x:x + width].T )
+        size = ( max( 1, round( width * scale ) ), max( 1, round( height * scale ) ) )
+        screen_width, screen_height = self.screen.get_size()
+        left = ( screen_width - size[0] ) // 2
+        top = ( screen_height - size[1] ) // 2
+        self.screen.fill( self.background_color )
+        self.screen.blit( pygame.transform.scale( self.surface, size ), ( left, top ) )
+
+        if scale < HEAD_MARKER_SCALE:
+            for player, color in players:
+                if player.is_alive:
+                    center = ( left + int( ( player.x - x ) * scale ), top + int( ( player.y - y ) * scale ) )
+                    pygame.draw.circle( self.screen, color, center, 3 )
+        for surface, position in overlay:
+            self.screen.blit( surface, position )
+        pygame.display.flip()
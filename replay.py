@@ -0,0 +1,179 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+
+from engine import DIRECTIONS
+
+# compact match recording
+#   header    "TRNR", version, board size, keyframe interval, seed, player count, start of every player,
+#             settings as json
+#   keyframe  "K", tick, every player (x, y, direction, alive), the whole board (one byte per cell)
+#   ticks     one direction byte per player per tick, straight after their keyframe
+#   index     (tick, offset) of every keyframe, then the trailer pointing to it
+# a reader maps the file and jumps to the keyframe before any tick, files cut by a crash have no
+# trailer and are indexed by walking the keyframes
+
+MAGIC = b"TRNR"
+INDEX_MAGIC = b"TRNI"
+# version 1 files have no player count and always two players
+VERSION = 2
+KEYFRAME_INTERVAL = 256
+
+HEADER = struct.Struct( "<4sHHHHq" )
+PLAYER_COUNT = struct.Struct( "<B" )
+PLAYER_START = struct.Struct( "<hhbb" )
+JSON_SIZE = struct.Struct( "<I" )
+KEYFRAME = struct.Struct( "<cI" )
+PLAYER_STATE = struct.Struct( "<hhBB" )
+INDEX_ENTRY = struct.Struct( "<IQ" )
+TRAILER = struct.Struct( "<IIbQ4s" )
+
+# one byte per direction, the player heading (an index in engine.DIRECTIONS)
+# the keyframe marker "K" can never be one of them
+
+
+class ReplayWriter:
+    def __init__( self, path, game, settings=None, keyframe_interval=KEYFRAME_INTERVAL ):
+        self.path = path
+        self.game = game
+        self.keyframe_interval = keyframe_interval
+        self.index = []
+        self.file = open( path, "wb" )
+
+        board = game.board
+        seed = game.seed if isinstance( game.seed, int ) else -1
+        self.file.write( HEADER.pack( MAGIC, VERSION, board.width, board.height, keyframe_interval, seed ) )
+        self.file.write( PLAYER_COUNT.pack( len( game.players ) ) )
+        for player in game.players:
+            x, y = player.start_pos
+            self.file.write( PLAYER_START.pack( x, y, *player.start_direction ) )
+        data = json.dumps( settings or {} ).encode()
+        self.file.write( JSON_SIZE.pack( len( data ) ) + data )
+        self.writeKeyframe()
+
+    def writeKeyframe( self ):
+        game = self.game
+        self.index.append( (game.tick, self.file.tell()) )
+        self.file.write( KEYFRAME.pack( b"K", game.tick ) )
+        for player in game.players:
+            self.file.write( PLAYER_STATE.pack( player.x, player.y, player.heading, player.is_alive ) )
+        self.file.write( game.board.cells )
+
+    def record( self ):
+        # call after every game.step, stores the direction each player moved with
+        game = self.game
+        self.file.write( bytes( player.heading for player in game.players ) )
+        if game.tick % self.keyframe_interval == 0 and game.result is None:
+            self.writeKeyframe()
+
+    def close( self ):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        for tick, offset in self.index:
+            self.file.write( INDEX_ENTRY.pack( tick, offset ) )
+        result = self.game.result if self.game.result is not None else -1
+        self.file.write( TRAILER.pack( self.game.tick, len( self.index ), result, index_offset, INDEX_MAGIC ) )
+        self.file.close()
+        self.file = None
+
+
+class ReplayReader:
+    def __init__( self, path ):
+        self.file = open( path, "rb" )
+        self.data = mmap.mmap( self.file.fileno(), 0, access=mmap.ACCESS_READ )
+        data = self.data
+
+        magic, version, self.width, self.height, self.keyframe_interval, self.seed = HEADER.unpack_from( data, 0 )
+        if magic != MAGIC or version not in ( 1, VERSION ):
+            raise ValueError( f"{path} is not a tron replay" )
+        offset = HEADER.size
+        self.player_count = 2
+        if version >= 2:
+            self.player_count, = PLAYER_COUNT.unpack_from( data, offset )
+            offset += PLAYER_COUNT.size
+        self.starts = []
+        for _ in range( self.player_count ):
+            x, y, dx, dy = PLAYER_START.unpack_from( data, offset )
+            self.starts.append( (x, y, [dx, dy]) )
+            offset += PLAYER_START.size
+        size, = JSON_SIZE.unpack_from( data, offset )
+        offset += JSON_SIZE.size
+        self.settings = json.loads( data[offset:offset + size] )
+        self.first_keyframe = offset + size
+        self.keyframe_size = KEYFRAME.size + self.player_count * PLAYER_STATE.size + self.width * self.height
+
+        if len( data ) >= TRAILER.size and data[-4:] == INDEX_MAGIC:
+            self.ticks, count, result, index_offset, _ = TRAILER.unpack_from( data, len( data ) - TRAILER.size )
+            self.result = result if result >= 0 else None
+            self.index = [ INDEX_ENTRY.unpack_from( data, index_offset + i * INDEX_ENTRY.size ) for i in range( count ) ]
+            self.end = index_offset
+        else:
+            self.result = None
+            self.end = len( data )
+            self.rebuildIndex()
+        self.keyframe_ticks = [ tick for tick, _ in self.index ]
+
+    def rebuildIndex( self ):
+        # no trailer, walk from keyframe to keyframe
+        self.index = []
+        offset = self.first_keyframe
+        tick = 0
+        while offset + self.keyframe_size <= self.end and self.data[offset:offset + 1] == b"K":
+            _, tick = KEYFRAME.unpack_from( self.data, offset )
+            self.index.append( (tick, offset) )
+            start = offset + self.keyframe_size
+            following = self.data.find( b"K", start, self.end )
+            offset = following if following >= 0 else self.end
+            tick += ( offset - start ) // self.player_count
+        self.ticks = tick
+
+    def directions( self, tick ):
+        # directions every player moved with from tick to tick + 1
+        count = self.player_count
+        i = bisect_right( self.keyframe_ticks, tick ) - 1
+        keyframe_tick, offset = self.index[i]
+        offset += self.keyframe_size + count * ( tick - keyframe_tick )
+        return [ DIRECTIONS[code] for code in self.data[offset:offset + count] ]
+
+    def load( self, game, tick ):
+        # put game in the state it had after tick, from the closest keyframe before it
+        tick = max( 0, min( tick, self.ticks ) )
+        i = bisect_right( self.keyframe_ticks, tick ) - 1
+        keyframe_tick, offset = self.index[i]
+        offset += KEYFRAME.size
+        states = []
+        for _ in range( self.player_count ):
+            states.append( PLAYER_STATE.unpack_from( self.data, offset ) )
+            offset += PLAYER_STATE.size
+        cells = self.data[offset:offset + self.width * self.height]
+
+        game.board.load( cells )
+        game.tick = keyframe_tick
+        game.result = None
+        for player, start, ( x, y, direction, alive ) in zip( game.players, self.starts, states ):
+            player.start_pos = start[:2]
+            player.start_direction = tuple( start[2] )
+            player.x = x
+            player.y = y
+            player.heading = direction
+            player.is_alive = bool( alive )
+            # trails only feed the renderer, their order does not matter
+            del player.trail[:]
+        for i, owner in enumerate( cells ):
+            if owner:
+                game.players[owner - 1].trail.append( i )
+
+        while game.tick < tick and game.result is None:
+            game.step( self.directions( game.tick ) )
+
+    def close( self ):
+        self.data.close()
+        self.file.close()
+
+
+def replayPath( directory, name ):
+    os.makedirs( directory, exist_ok=True )
+    return os.path.join( directory, f"{name}.trr" )
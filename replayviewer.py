@@ -0,0 +1,88 @@
+import pygame
+
+from engine import TronGame
+from render import TrailRenderer, ViewportRenderer, Camera, SURFARRAY
+from replay import ReplayReader
+
+# plays a recorded match with the normal renderer
+#   space        pause
+#   up / down    faster / slower
+#   left / right 5 seconds back / forward
+#   home / end   start / end of the match
+#   click        jump to that point of the progress bar
+#   tab / [ / ]  camera on the next player / zoom out / zoom in
+
+SEEK_TICKS = 150
+SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 64]
+BAR_HEIGHT = 6
+
+
+def playReplay( screen, clock, font, path, grid_size, fps, colors, tick_rate ):
+    reader = ReplayReader( path )
+    game = TronGame( reader.width, reader.height, player_count=reader.player_count )
+    camera = Camera( reader.width, reader.height, *screen.get_size(), grid_size )
+    if SURFARRAY:
+        renderer = ViewportRenderer( screen, game.board, camera, colors["black"] )
+    else:
+        renderer = TrailRenderer( screen, grid_size, colors["black"] )
+    player_colors = []
+    for i, player in enumerate( game.players ):
+        player_settings = reader.settings.get( f"player{i+1}", {} )
+        player_colors.append( (player, tuple( player_settings.get( "color", colors.get( f"player{i+1}", colors["white"] ) ) )) )
+
+    width, height = screen.get_size()
+    reader.load( game, 0 )
+    speed = SPEEDS.index( 1 )
+    paused = False
+    progress = 0.0
+    running = True
+
+    def seek( tick ):
+        reader.load( game, tick )
+        renderer.reset()
+
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                if event.key == pygame.K_UP:
+                    speed = min( speed + 1, len( SPEEDS ) - 1 )
+                if event.key == pygame.K_DOWN:
+                    speed = max( speed - 1, 0 )
+                if event.key == pygame.K_RIGHT:
+                    seek( game.tick + SEEK_TICKS )
+                if event.key == pygame.K_LEFT:
+                    seek( game.tick - SEEK_TICKS )
+                if event.key == pygame.K_HOME:
+                    seek( 0 )
+                if event.key == pygame.K_END:
+                    seek( reader.ticks )
+                if event.key == pygame.K_TAB:
+                    camera.cycle( len( game.players ) )
+                if event.key == pygame.K_LEFTBRACKET:
+                    camera.zoom( -1 )
+                if event.key == pygame.K_RIGHTBRACKET:
+                    camera.zoom( 1 )
+            if event.type == pygame.MOUSEBUTTONDOWN and event.pos[1] >= height - 4 * BAR_HEIGHT:
+                seek( int( event.pos[0] / width * reader.ticks ) )
+
+        if not paused:
+            progress += SPEEDS[speed] * tick_rate / fps
+            while progress >= 1 and game.tick < reader.ticks and game.result is None:
+                game.step( reader.directions( game.tick ) )
+                progress -= 1
+            progress = min( progress, 1 )
+
+        status = f"tick {game.tick}/{reader.ticks}  x{SPEEDS[speed]}" + ( "  paused" if paused else "" )
+        text = font.render( status, True, colors["white"] )
+        bar = pygame.Surface( (max( 1, width * game.tick // max( reader.ticks, 1 ) ), BAR_HEIGHT) )
+        bar.fill( colors["gray"] )
+        renderer.render( player_colors, status, [(text, (10, 10)), (bar, (0, height - BAR_HEIGHT))] )
+        clock.tick( fps )
+
+    reader.close()
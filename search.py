@@ -0,0 +1,186 @@
+from time import perf_counter
+
+from territory import TerritoryEvaluator
+
+# two player alpha-beta for the bot
+# both players move at the same time, the search lets the bot move first and the other player
+# answer knowing that move (the safe assumption), then both new heads are checked together
+# the board is edited in place (make / unmake) and hashed with zobrist keys of the cells
+# written during the search, so positions are only compared inside one decision
+
+WIN = 1000000
+EXACT = 0
+LOWER = 1
+UPPER = 2
+TABLE_SIZE = 200000
+# zobrist keys are mixed from the cell index when asked for, a table of them would take 24 bytes a
+# cell (about 100 MB on the biggest arena) for the few hundred cells a decision hashes
+TRAIL = 0
+MY_HEAD = 1
+OTHER_HEAD = 2
+MASK = ( 1 << 64 ) - 1
+
+
+def cellKey( kind, i ):
+    # splitmix64 of the cell index and what is on it
+    z = ( ( i * 3 + kind + 1 ) * 0x9E3779B97F4A7C15 ) & MASK
+    z = ( ( z ^ ( z >> 30 ) ) * 0xBF58476D1CE4E5B9 ) & MASK
+    z = ( ( z ^ ( z >> 27 ) ) * 0x94D049BB133111EB ) & MASK
+    return z ^ ( z >> 31 )
+
+
+class SearchTimeout( Exception ):
+    pass
+
+
+class AlphaBetaSearch:
+    def __init__( self, width, height, table_size=TABLE_SIZE ):
+        self.width = width
+        self.height = height
+        self.table_size = table_size
+        self.territory = TerritoryEvaluator( width, height )
+        self.table = {}
+        self.nodes = 0
+        self.depth = 0
+        self.deadline = 0.0
+        self.node_limit = None
+        self.territory_depth = None
+
+    def moves( self, board, x, y, direction, other_head ):
+        dx, dy = direction
+        moves = []
+        for d in ( (dx, dy), (-dy, dx), (dy, -dx) ):
+            nx = x + d[0]
+            ny = y + d[1]
+            if board.isFree( nx, ny ) and (nx, ny) != other_head:
+                moves.append( d )
+        return moves
+
+    def evaluate( self, board, me, other ):
+        _, _, mine, theirs = self.territory.evaluate( board, me, other, (), self.territory_depth )
+        return mine - theirs
+
+    def alphabeta( self, board, me, my_dir, other, other_dir, depth, ply, alpha, beta, key ):
+        self.nodes += 1
+        # a leaf costs a territory search, far more than a look at the clock
+        if self.nodes > self.node_limit or perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        my_moves = self.moves( board, me[0], me[1], my_dir, other )
+        their_moves = self.moves( board, other[0], other[1], other_dir, me )
+        if not my_moves and not their_moves:
+            return 0, None
+        if not my_moves:
+            return -WIN + ply, None
+        if not their_moves:
+            return WIN - ply, None
+        if depth == 0:
+            return self.evaluate( board, me, other ), None
+
+        alpha_start = alpha
+        best_move = None
+        entry = self.table.get( key )
+        if entry is not None:
+            entry_depth, entry_value, entry_flag, best_move = entry
+            if entry_depth >= depth:
+                if entry_flag == EXACT:
+                    return entry_value, best_move
+                if entry_flag == LOWER and entry_value >= beta:
+                    return entry_value, best_move
+                if entry_flag == UPPER and entry_value <= alpha:
+                    return entry_value, best_move
+            # best move of the previous iteration is searched first
+            if best_move in my_moves:
+                my_moves.remove( best_move )
+                my_moves.insert( 0, best_move )
+
+        width = self.width
+        cells = board.cells
+        me_index = me[1] * width + me[0]
+        other_index = other[1] * width + other[0]
+        # both heads turn into trail for the rest of the line
+        base_key = key ^ cellKey( MY_HEAD, me_index ) ^ cellKey( OTHER_HEAD, other_index ) \
+            ^ cellKey( TRAIL, me_index ) ^ cellKey( TRAIL, other_index )
+
+        best = -WIN - 1
+        for move in my_moves:
+            nme = (me[0] + move[0], me[1] + move[1])
+            my_key = base_key ^ cellKey( MY_HEAD, nme[1] * width + nme[0] )
+            value = WIN + 1
+            beta_reply = beta
+            for reply in their_moves:
+                nother = (other[0] + reply[0], other[1] + reply[1])
+                if nother == nme:
+                    # head on, both players die
+                    score = 0
+                else:
+                    nother_index = nother[1] * width + nother[0]
+                    # written behind the back of the summed-area table, the search never asks it
+                    # and every cell is given back before the board is used again
+                    cells[me_index] = 1
+                    cells[other_index] = 2
+                    try:
+                        score, _ = self.alphabeta(
+                            board, nme, move, nother, reply, depth - 1, ply + 1,
+                            alpha, beta_reply,
+                            my_key ^ cellKey( OTHER_HEAD, nother_index )
+                        )
+                    finally:
+                        cells[me_index] = 0
+                        cells[other_index] = 0
+                if score < value:
+                    value = score
+                if value < beta_reply:
+                    beta_reply = value
+                if value <= alpha:
+                    break
+            if value > best:
+                best = value
+                best_move = move
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= alpha_start:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len( self.table ) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (depth, best, flag, best_move)
+        return best, best_move
+
+    def bestMove( self, board, me, my_dir, other, other_dir, budget, max_depth=None, territory_depth=None, max_nodes=None ):
+        # iterative deepening until the budget (seconds), max_nodes or max_depth runs out, a budget of None
+        # never looks at the clock and gives the same answer on any machine, with both a budget and max_nodes
+        # the nodes decide the move and the budget only cuts a search running late (one leaf past it at most)
+        # returns the best move of the deepest finished iteration, or None when every move loses at once
+        start = perf_counter()
+        self.deadline = start + budget if budget is not None else float( "inf" )
+        self.node_limit = max_nodes if max_nodes is not None else float( "inf" )
+        self.table.clear()
+        self.nodes = 0
+        self.territory_depth = territory_depth
+        my_dir = tuple( my_dir )
+        other_dir = tuple( other_dir )
+
+        key = cellKey( MY_HEAD, me[1] * self.width + me[0] ) ^ cellKey( OTHER_HEAD, other[1] * self.width + other[0] )
+        best_move = None
+        self.depth = 0
+        depth = 1
+        while max_depth is None or depth <= max_depth:
+            try:
+                value, move = self.alphabeta( board, me, my_dir, other, other_dir, depth, 0, -WIN - 1, WIN + 1, key )
+            except SearchTimeout:
+                break
+            if move is not None:
+                best_move = move
+            self.depth = depth
+            # the end of the game is already in sight, deeper will not change anything
+            if abs( value ) >= WIN - depth:
+                break
+            depth += 1
+        return best_move
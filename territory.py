@@ -0,0 +1,157 @@
+import threading
+from array import array
+
+# breadth first search from both heads over the board
+# every buffer is allocated once per board size, a call only bumps a generation number
+# so nothing has to be cleared or allocated while the bot is thinking
+
+# above this many cells the neighbours are computed on the fly instead of kept in a table
+NEIGHBOR_TABLE_CELLS = 1 << 18
+# (width, height) -> neighbour table, the tables are never written after they are built
+neighbor_tables = {}
+# (width, height) -> SearchBuffers of the thread, 24 bytes a cell (about 100 MB on the biggest arena)
+# the evaluators of a thread never search at the same time, so all of them (the search, the territory
+# scoring and the endgame of every bot) share the buffers and their generation number
+thread_buffers = threading.local()
+# typecode of every buffer, all of them 4 bytes a cell
+BUFFER_TYPES = {
+    "dist1": "i", "dist2": "i",
+    # a cell belongs to the current search only if its stamp is the current generation
+    "seen1": "I", "seen2": "I",
+    "queue1": "i", "queue2": "i"
+}
+
+
+class SearchBuffers:
+    # a buffer is only allocated the first time a search asks for it, the partition check of the
+    # endgame for instance only ever stamps seen1
+    def __init__( self, size ):
+        self.size = size
+        self.generation = 0
+
+    def __getattr__( self, name ):
+        typecode = BUFFER_TYPES.get( name )
+        if typecode is None:
+            raise AttributeError( name )
+        buffer = array( typecode, bytes( 4 * self.size ) )
+        setattr( self, name, buffer )
+        return buffer
+
+
+def searchBuffers( width, height ):
+    tables = getattr( thread_buffers, "tables", None )
+    if tables is None:
+        tables = thread_buffers.tables = {}
+    buffers = tables.get( (width, height) )
+    if buffers is None:
+        buffers = tables[(width, height)] = SearchBuffers( width * height )
+    return buffers
+
+
+class TerritoryEvaluator:
+    def __init__( self, width, height ):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.buffers = searchBuffers( width, height )
+        # neighbours of every cell inside the board, built once per board size and shared by every
+        # evaluator (the search, the territory scoring and the endgame of each bot all have one)
+        self.neighbors = None
+        if size <= NEIGHBOR_TABLE_CELLS:
+            self.neighbors = neighbor_tables.get( (width, height) )
+            if self.neighbors is None:
+                self.neighbors = neighbor_tables[(width, height)] = [ self.around( i ) for i in range( size ) ]
+
+    dist1 = property( lambda self: self.buffers.dist1 )
+    dist2 = property( lambda self: self.buffers.dist2 )
+    seen1 = property( lambda self: self.buffers.seen1 )
+    seen2 = property( lambda self: self.buffers.seen2 )
+    queue1 = property( lambda self: self.buffers.queue1 )
+    queue2 = property( lambda self: self.buffers.queue2 )
+
+    @property
+    def generation( self ):
+        return self.buffers.generation
+
+    @generation.setter
+    def generation( self, generation ):
+        self.buffers.generation = generation
+
+    def around( self, i ):
+        width = self.width
+        y, x = divmod( i, width )
+        if 0 < x < width - 1 and 0 < y < self.height - 1:
+            return (i - 1, i + 1, i - width, i + width)
+        return tuple(
+            n for n, ok in (
+                (i - 1, x > 0),
+                (i + 1, x < width - 1),
+                (i - width, y > 0),
+                (i + width, y < self.height - 1)
+            ) if ok
+        )
+
+    def search( self, cells, start, dist, seen, queue, max_depth ):
+        # returns the number of cells reached from start, they are listed at the front of queue
+        # walls are cells already stamped in seen before the search
+        neighbors = self.neighbors
+        around = self.around
+        generation = self.generation
+        seen[start] = generation
+        dist[start] = 0
+        queue[0] = start
+        head = 0
+        tail = 1
+        while head < tail:
+            i = queue[head]
+            head += 1
+            d = dist[i] + 1
+            if d > max_depth:
+                continue
+            for n in ( neighbors[i] if neighbors is not None else around( i ) ):
+                if cells[n] == 0 and seen[n] != generation:
+                    seen[n] = generation
+                    dist[n] = d
+                    queue[tail] = n
+                    tail += 1
+        return tail
+
+    def evaluate( self, board, pos1, pos2, blocked=(), max_depth=None ):
+        # returns (reachable1, reachable2, voronoi1, voronoi2)
+        # voronoi counts the cells a player reaches strictly before the other one
+        if max_depth is None:
+            max_depth = self.width * self.height
+        self.generation += 1
+        generation = self.generation
+        width = self.width
+        seen1, seen2 = self.seen1, self.seen2
+        for x, y in blocked:
+            if 0 <= x < width and 0 <= y < self.height:
+                seen1[y * width + x] = generation
+                seen2[y * width + x] = generation
+
+        cells = board.cells
+        if not ( board.isInside( *pos1 ) and board.isInside( *pos2 ) ):
+            return 0, 0, 0, 0
+        start1 = pos1[1] * width + pos1[0]
+        start2 = pos2[1] * width + pos2[0]
+        # each head is a wall for the other player
+        seen1[start2] = generation
+        seen2[start1] = generation
+        reached1 = self.search( cells, start1, self.dist1, seen1, self.queue1, max_depth )
+        reached2 = self.search( cells, start2, self.dist2, seen2, self.queue2, max_depth )
+
+        dist1, dist2 = self.dist1, self.dist2
+        queue1, queue2 = self.queue1, self.queue2
+        voronoi1 = 0
+        for k in range( 1, reached1 ):
+            i = queue1[k]
+            if seen2[i] != generation or dist1[i] < dist2[i]:
+                voronoi1 += 1
+        voronoi2 = 0
+        for k in range( 1, reached2 ):
+            i = queue2[k]
+            if seen1[i] != generation or dist2[i] < dist1[i]:
+                voronoi2 += 1
+        # the heads themselves are not territory
+        return reached1 - 1, reached2 - 1, voronoi1, voronoi2
@@ -0,0 +1,111 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from engine import TronGame
+from headless import playMatch
+
+DIFFICULTIES = [1, 2, 3, 4, 5, 6]
+# games sent to a worker at once, small enough to stream results, big enough to hide the IPC cost
+CHUNK_SIZE = 25
+
+
+def gameSeed( seed, p1, p2, game ):
+    # same tournament seed -> same seed for every single game, whatever worker plays it
+    return ( ( seed * 31 + p1 ) * 31 + p2 ) * 1000003 + game
+
+
+def playChunk( p1, p2, seeds, random_start ):
+    game = TronGame( random_start=random_start )
+    results = [0, 0, 0]
+    ticks = 0
+    start = perf_counter()
+    for seed in seeds:
+        result, match_ticks = playMatch( game, [p1, p2], seed )
+        results[result] += 1
+        ticks += match_ticks
+    return {
+        "pair": (p1, p2),
+        "results": results,
+        "ticks": ticks,
+        "elapsed": perf_counter() - start,
+        "worker": os.getpid()
+    }
+
+
+def runTournament( games, seed=0, workers=None, random_start=False, difficulties=DIFFICULTIES, on_result=None ):
+    # matrix[(p1, p2)] = [egality, p1 wins, p2 wins]
+    matrix = { (p1, p2): [0, 0, 0] for p1 in difficulties for p2 in difficulties }
+    worker_stats = {}
+    start = perf_counter()
+
+    with ProcessPoolExecutor( max_workers=workers ) as pool:
+        futures = []
+        for p1, p2 in matrix:
+            seeds = [ gameSeed( seed, p1, p2, g ) for g in range( games ) ]
+            for i in range( 0, games, CHUNK_SIZE ):
+                futures.append( pool.submit( playChunk, p1, p2, seeds[i:i+CHUNK_SIZE], random_start ) )
+
+        for future in as_completed( futures ):
+            chunk = future.result()
+            cell = matrix[chunk["pair"]]
+            for i in range( 3 ):
+                cell[i] += chunk["results"][i]
+            stats = worker_stats.setdefault( chunk["worker"], {"games": 0, "ticks": 0, "elapsed": 0.0} )
+            stats["games"] += sum( chunk["results"] )
+            stats["ticks"] += chunk["ticks"]
+            stats["elapsed"] += chunk["elapsed"]
+            if on_result is not None:
+                on_result( chunk )
+
+    return matrix, worker_stats, perf_counter() - start
+
+
+def printMatrix( matrix, difficulties=DIFFICULTIES ):
+    # win/draw/loss of the row bot (player 1) against the column bot (player 2)
+    width = 14
+    print( "p1 \\ p2".ljust( 8 ) + "".join( f"bot:{p2}".rjust( width ) for p2 in difficulties ) )
+    for p1 in difficulties:
+        row = f"bot:{p1}".ljust( 8 )
+        for p2 in difficulties:
+            draws, wins, losses = matrix[(p1, p2)]
+            row += f"{wins}/{draws}/{losses}".rjust( width )
+        print( row )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --tournament", description="every difficulty against every difficulty on a process pool" )
+    parser.add_argument( "--tournament", action="store_true" )
+    parser.add_argument( "--games", type=int, default=100, help="games per difficulty pair" )
+    parser.add_argument( "--workers", type=int, default=None, help="defaults to the number of cores" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--random-start", action="store_true", help="mirrored random start positions" )
+    parser.add_argument( "--quiet", action="store_true", help="do not stream chunk results" )
+    args = parser.parse_args( argv )
+
+    total = len( DIFFICULTIES ) ** 2 * args.games
+    done = [0]
+
+    def progress( chunk ):
+        done[0] += sum( chunk["results"] )
+        if not args.quiet:
+            p1, p2 = chunk["pair"]
+            draws, wins, losses = chunk["results"]
+            print( f"[{done[0]}/{total}] bot:{p1} vs bot:{p2} -> {wins}/{draws}/{losses} (worker {chunk['worker']})" )
+
+    matrix, worker_stats, elapsed = runTournament( args.games, args.seed, args.workers, args.random_start, on_result=progress )
+
+    print()
+    printMatrix( matrix )
+    print()
+    games = sum( sum( cell ) for cell in matrix.values() )
+    ticks = sum( stats["ticks"] for stats in worker_stats.values() )
+    print( f"games: {games} in {elapsed:.2f}s ({games / max( elapsed, 1e-9 ):.1f} games/sec, {ticks / max( elapsed, 1e-9 ):.0f} ticks/sec)" )
+    for worker, stats in sorted( worker_stats.items() ):
+        busy = max( stats["elapsed"], 1e-9 )
+        print( f"worker {worker}: {stats['games']} games, {stats['games'] / busy:.1f} games/sec, {stats['ticks'] / busy:.0f} ticks/sec" )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,82 @@
 try:
-    import pygame
-    import random
     import json
-    from time import time
     import os.path
     import traceback
     import sys
+    from time import strftime, perf_counter
+    from logger import Logger, DEFAULT_LOG_SETTINGS
 
     # debug function
-    def debugPrint( msg, level ):
-        # print( f"level:{level}", msg )
-        with open( "debug.log", "a" ) as f:
-            f.write(  f"level:{level} "+ str(msg) + "\n" )
+    logger = Logger( "debug.log" )
+    def debugPrint( msg, level, *args ):
+        logger.log( msg, level, *args )
+
+    # bot matches without a window
+    if "--headless" in sys.argv:
+        import headless
+        headless.main()
+        sys.exit()
+    if "--tournament" in sys.argv:
+        import tournament
+        tournament.main()
+        sys.exit()
+    if "--tune" in sys.argv:
+        import tuner
+        tuner.main()
+        sys.exit()
+    if "--dataset" in sys.argv:
+        import dataset
+        dataset.main()
+        sys.exit()
+    if "--fit" in sys.argv:
+        import evaluator
+        evaluator.main()
+        sys.exit()
+    if "--book" in sys.argv:
+        import bookbuilder
+        bookbuilder.main()
+        sys.exit()
+    if "--serve" in sys.argv:
+        import net
+        net.main()
+        sys.exit()
+
+    import pygame
+    from engine import TronGame, REACTION_TICKS, MCTS_WORKERS
+    from render import TrailRenderer, ViewportRenderer, Camera, SURFARRAY
+    from botcontroller import BotController
+    from replay import ReplayWriter, replayPath
+    from profiler import Profiler
+    from hud import TextCache, PerformanceOverlay
 
     # game settings
     VERSION = "2.1.1"
     WINDOW_WIDTH = 800
     WINDOW_HEIGHT = 600
+    # pixels per cell when the camera follows a player, tab / "[" / "]" change the camera
     GRID_SIZE = 5
-    FPS = 30
-
-    # AI settings
-    REACTION_TIME = 0.032
-    RADIUS_AI_VISION = 8
-    AGGRESSION = 1
-    LOOKAHEAD_DEPTH = 3
+    # the arena is set in cells in settings.json
+    MAX_ARENA_SIZE = 2000
+    # frames per second of the window, the simulation runs at settings["tick_rate"] ticks per second
+    FPS = 60
+    # slow motion and fast forward, "-" and "=" go through them, "0" runs as many ticks as a frame allows
+    SPEEDS = [0.25, 0.5, 1, 2, 4]
+    # a late frame never runs more ticks than this, the simulation slows down instead of spiralling
+    MAX_TICKS_PER_FRAME = 8
+    # "player3", "player4", ... can be added in settings.json, only the first two have keyboard controls
+    MAX_PLAYERS = 16
+    EXTRA_PLAYER_COLORS = [
+        (0, 128, 255), (255, 128, 0), (255, 0, 255), (0, 255, 255), (128, 255, 0), (255, 255, 255),
+        (128, 0, 255), (255, 128, 128), (128, 128, 255), (0, 255, 128), (255, 200, 0), (160, 160, 160),
+        (0, 160, 160), (200, 100, 50)
+    ]
+    # bots think in their own process so a slow search never stalls the frame
+    ASYNC_BOTS = True
+    # every match is saved for "python tron.py --replay <file>"
+    RECORD_REPLAYS = True
+    REPLAY_DIRECTORY = "replays"
+    # F3 writes the frame timings in the log and exports them in this folder
+    PROFILE_DIRECTORY = "profiles"
 
 
     # default settings
@@ -41,21 +93,25 @@ try:
             "bot": True,
             "difficulty": 4
         },
+        "log": dict( DEFAULT_LOG_SETTINGS ),
+        "tick_rate": 30,
+        "arena": {
+            "width": 160,
+            "height": 120
+        },
         "version": VERSION
     }
 
     backup_load = 0
-    TOTAL_LOAD = 9
+    TOTAL_LOAD = 12
     backup_settings = DEFAULT_SETTINGS
 
     # verify if files exists
     if os.path.exists( "./debug.log" ):
-        with open( "debug.log", "w" ) as f:
-            f.write( f"LOG START -- {time()}\n" )
+        logger.start()
         debugPrint( "modifying log", 2 )
     else:
-        with open( "debug.log", "x" ) as f:
-            f.write( f"LOG START -- {time()}\n" )
+        logger.start()
         debugPrint( "creating log", 2 )
 
     if os.path.exists( "./settings.json" ):
@@ -79,12 +135,22 @@ try:
             backup_load += 1
             backup_settings["player2"]["difficulty"] = settings["player2"]["difficulty"]
             backup_load += 1
+            backup_settings["log"] = settings["log"]
+            backup_load += 1
+            backup_settings["tick_rate"] = settings["tick_rate"]
+            backup_load += 1
+            backup_settings["arena"] = settings["arena"]
+            backup_load += 1
+            n = 3
+            while f"player{n}" in settings and n <= MAX_PLAYERS:
+                backup_settings[f"player{n}"] = settings[f"player{n}"]
+                n += 1
             if settings["version"] != VERSION:
                 raise KeyError( f"Not good version, expected {settings["version"]}, got {VERSION}" )
         except KeyError as e:
-            debugPrint( str( e ), 5 )
-            debugPrint( f"settings.json not formatted, expected {DEFAULT_SETTINGS}, got {settings}", 4 )
-            debugPrint( f"backup is at {backup_load}, load is at {backup_load}/{TOTAL_LOAD}", 4 )
+            debugPrint( "%s", 5, e )
+            debugPrint( "settings.json not formatted, expected %s, got %s", 4, DEFAULT_SETTINGS, settings )
+            debugPrint( "backup is at %s, load is at %s/%s", 4, backup_load, backup_load, TOTAL_LOAD )
             
             
             if backup_load == TOTAL_LOAD:
@@ -94,304 +160,269 @@ try:
             with open("settings.json", "w") as f:
                 json.dump(settings, f, indent=4)
     else:
-        debugPrint( f"No settings.json detected", 4 )
+        debugPrint( "No settings.json detected", 4 )
         with open("settings.json", "w") as f:
             json.dump(DEFAULT_SETTINGS, f, indent=4)
 
 
-    debugPrint( f"game settings : {settings}", 2 )
+    logger.configure( settings["log"] )
+    debugPrint( "game settings : %s", 2, settings )
+
+    PLAYER_COUNT = 2
+    while f"player{PLAYER_COUNT + 1}" in settings and PLAYER_COUNT < MAX_PLAYERS:
+        PLAYER_COUNT += 1
+        player_settings = settings[f"player{PLAYER_COUNT}"]
+        player_settings.setdefault( "name", f"Player {PLAYER_COUNT}" )
+        player_settings.setdefault( "color", EXTRA_PLAYER_COLORS[PLAYER_COUNT - 3] )
+        player_settings.setdefault( "difficulty", 2 )
+        if not player_settings.get( "bot", True ):
+            debugPrint( "player%s has no keyboard controls, it is played by a bot", 4, PLAYER_COUNT )
+        player_settings["bot"] = True
 
     pygame.init()
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("TRON")
     clock = pygame.time.Clock()
     font = pygame.font.Font( None, 36 )
+    small_font = pygame.font.Font( None, 22 )
 
     COLORS = {
         "black": (0, 0, 0),
         "white": (255, 255, 255),
-        "gray": (150, 150, 150),
-        "player1": tuple(settings["player1"]["color"]),
-        "player2": tuple(settings["player2"]["color"])
+        "gray": (150, 150, 150)
     }
-
-    debugPrint( f"all colors : {COLORS}", 1 )
-
-
-    class Player( pygame.sprite.Sprite ):
-        def __init__( self, x, y, direction, color, player ):
-            global settings
-
-            self.start_pos = (x, y)
-            self.start_direction = direction
-            self.last_bot_think = time()
-
-            self.is_alive = True
-            self.direction = direction
-            self.color = color
-            self.trail = []
-            self.player = player
-            self.image = pygame.Surface( [ GRID_SIZE, GRID_SIZE ] )
-            self.image.fill( self.color )
-            self.pos = self.image.get_rect()
-            self.pos.x = x
-            self.pos.y = y
-
-        def update( self ):
-            self.trail.append( (self.pos.x, self.pos.y) )
-            self.pos.x += self.direction[0] * GRID_SIZE
-            self.pos.y += self.direction[1] * GRID_SIZE
-
-        def updatePlayer( self ):
-            if not self.is_alive:
-                return
-            keys = pygame.key.get_pressed()
-            if self.player == 1:
-                if keys[pygame.K_w] and [0, 1] != self.direction:
-                    self.direction = [0, -1]
-                if keys[pygame.K_a] and [1, 0] != self.direction:
-                    self.direction = [-1, 0]
-                if keys[pygame.K_s] and [0, -1] != self.direction:
-                    self.direction = [0, 1]
-                if keys[pygame.K_d] and [-1, 0] != self.direction:
-                    self.direction = [1, 0]
-            if self.player == 2:
-                if keys[pygame.K_UP] and [0, 1] != self.direction:
-                    self.direction = [0, -1]
-                if keys[pygame.K_LEFT] and [1, 0] != self.direction:
-                    self.direction = [-1, 0]
-                if keys[pygame.K_DOWN] and [0, -1] != self.direction:
-                    self.direction = [0, 1]
-                if keys[pygame.K_RIGHT] and [-1, 0] != self.direction:
-                    self.direction = [1, 0]
-
-        
-        def updateBot( self, difficulty, trail, other_pos ):
-
-            now = time()
-            if now - self.last_bot_think < REACTION_TIME:
-                return
-            self.last_bot_think = now
-
-
-            dx, dy = self.direction
-            dirs = [(dx, dy), (-dy, dx), (dy, -dx)]
-            moves = []
-            for d in dirs:
-                nx = self.pos.x + d[0] * GRID_SIZE
-                ny = self.pos.y + d[1] * GRID_SIZE
-                if 0 <= nx < WINDOW_WIDTH and 0 <= ny < WINDOW_HEIGHT:
-                    if (nx, ny) not in self.trail + trail:
-                        moves.append(d)
-            
-
-            if not moves:
-                return
-
-            if difficulty == 1:
-                self.direction = random.choice( moves )
-                return
-
-            def fast_space(x, y, trails):
-                score = 0
-                for dx in range(-RADIUS_AI_VISION, RADIUS_AI_VISION + 1):
-                    for dy in range(-RADIUS_AI_VISION, RADIUS_AI_VISION + 1):
-                        nx = x + dx * GRID_SIZE
-                        ny = y + dy * GRID_SIZE
-                        if 0 <= nx < WINDOW_WIDTH and 0 <= ny < WINDOW_HEIGHT:
-                            if (nx, ny) not in trails:
-                                score += 1
-                return score
-
-            if difficulty == 2:
-                best = max(
-                    moves, key=lambda d: fast_space(
-                        self.pos.x + d[0]*GRID_SIZE,
-                        self.pos.y + d[1]*GRID_SIZE,
-                        self.trail + trail
-                    )
-                )
-                self.direction = best
-                return
-            
-            def valid_moves(x, y, direction, trails):
-                dx, dy = direction
-                dirs = [(dx, dy), (-dy, dx), (dy, -dx)]
-                moves = []
-                for d in dirs:
-                    nx = x + d[0] * GRID_SIZE
-                    ny = y + d[1] * GRID_SIZE
-                    if 0 <= nx < WINDOW_WIDTH and 0 <= ny < WINDOW_HEIGHT:
-                        if (nx, ny) not in trails:
-                            moves.append(d)
-                return moves
-
-            def evaluate(x, y, trails):
-                space = fast_space(x, y, trails)
-                dist = abs(x - other_pos[0]) + abs(y - other_pos[1])
-                return space * (1 - AGGRESSION) - dist * AGGRESSION
-
-            def simulate(x, y, direction, occ, depth, trails):
-                if depth == 0:
-                    return evaluate(x, y, trails)
-
-                best = -999999
-                for d in valid_moves(x, y, direction, trails):
-                    nx = x + d[0]*GRID_SIZE
-                    ny = y + d[1]*GRID_SIZE
-                    if (nx, ny) in occ:
-                        continue
-                    score = simulate(
-                        nx, ny, d,
-                        occ | {(nx, ny)},
-                        depth - 1,
-                        trails
-                    )
-                    best = max(best, score)
-                return best
-
-            best_dir = None
-            best_score = -999999
-
-            for d in moves:
-                nx = self.pos.x + d[0]*GRID_SIZE
-                ny = self.pos.y + d[1]*GRID_SIZE
-                score = simulate(
-                    nx, ny, d,
-                    set(self.trail+trail) | {(nx, ny)},
-                    LOOKAHEAD_DEPTH,
-                    self.trail+trail
-                )
-                if score > best_score:
-                    best_score = score
-                    best_dir = d
-
-            if best_dir:
-                self.direction = best_dir
-            
-            # if self.direction[0] == 0:
-            #     if self.pos.y-other_pos[1] == GRID_SIZE*2*self.direction[1]:
-            #         if self.pos.x < other_pos[0]:
-            #             self.direction = [-1, 0]
-            #         if self.pos.x > other_pos[0]:
-            #             self.direction = [1, 0]
-            # elif self.direction[1] == 0:
-            #     if self.pos.y-other_pos[0] == GRID_SIZE*2*self.direction[1]:
-            #         if self.pos.x < other_pos[1]:
-            #             self.direction = [0, -1]
-            #         if self.pos.x > other_pos[1]:
-            #             self.direction = [0, 1]
-
-        
-        def isAlive( self, other_trail ):
-            if ( self.pos.x, self.pos.y ) in self.trail + other_trail:
-                self.is_alive = False
-            if self.pos.x < 0 or self.pos.x >= WINDOW_WIDTH:
-                self.is_alive = False
-            if self.pos.y < 0 or self.pos.y >= WINDOW_HEIGHT:
-                self.is_alive = False
-
-        def drawTrail( self ):
-            global screen
-            for x, y in self.trail:
-                pygame.draw.rect( screen, self.color, ( x, y, GRID_SIZE, GRID_SIZE ) )
-        
-        def getTrail( self ):
-            return self.trail + [(self.pos.x, self.pos.y)]
-        
-        def getPossibleTrail( self ):
-            to_return = self.trail + [
-                (
-                    self.pos.x,
-                    self.pos.y
-                ),
-                (
-                    self.pos.x+self.direction[0]*GRID_SIZE,
-                    self.pos.y+self.direction[1]*GRID_SIZE
-                )
-            ]
-            return to_return
-        
-        def reset( self ):
-            self.trail = []
-            self.pos.x = self.start_pos[0]
-            self.pos.y = self.start_pos[1]
-            self.direction = self.start_direction
-            self.is_alive = True
-        
-        def getPos( self ):
-            return (self.pos.x, self.pos.y)
-
-
-    player1 = Player( 150, 300, [1, 0], COLORS["player1"], 1 )
-    player2 = Player( 650, 300, [-1, 0], COLORS["player2"], 2 )
-
-    debugPrint( f"player 1 color {COLORS["player1"]}", 1 )
-    debugPrint( f"player 2 color {COLORS["player2"]}", 1 )
+    for i in range( PLAYER_COUNT ):
+        COLORS[f"player{i+1}"] = tuple(settings[f"player{i+1}"]["color"])
+
+    debugPrint( "all colors : %s", 1, COLORS )
+
+    if "--replay" in sys.argv:
+        from replayviewer import playReplay
+        playReplay( screen, clock, font, sys.argv[sys.argv.index( "--replay" ) + 1], GRID_SIZE, FPS, COLORS, settings["tick_rate"] )
+        logger.close()
+        sys.exit()
+
+    if "--connect" in sys.argv:
+        from netgame import playOnline
+        room = int( sys.argv[sys.argv.index( "--room" ) + 1] ) if "--room" in sys.argv else 0
+        players = int( sys.argv[sys.argv.index( "--players" ) + 1] ) if "--players" in sys.argv else 2
+        playOnline( screen, font, sys.argv[sys.argv.index( "--connect" ) + 1], room, players, GRID_SIZE, FPS, COLORS )
+        logger.close()
+        sys.exit()
+
+
+    # keyboard controls, returns the direction asked by the player
+    def updatePlayer( player ):
+        if not player.is_alive:
+            return None
+        keys = pygame.key.get_pressed()
+        direction = player.direction
+        if player.player == 1:
+            if keys[pygame.K_w] and (0, 1) != direction:
+                direction = (0, -1)
+            if keys[pygame.K_a] and (1, 0) != direction:
+                direction = (-1, 0)
+            if keys[pygame.K_s] and (0, -1) != direction:
+                direction = (0, 1)
+            if keys[pygame.K_d] and (-1, 0) != direction:
+                direction = (1, 0)
+        if player.player == 2:
+            if keys[pygame.K_UP] and (0, 1) != direction:
+                direction = (0, -1)
+            if keys[pygame.K_LEFT] and (1, 0) != direction:
+                direction = (-1, 0)
+            if keys[pygame.K_DOWN] and (0, -1) != direction:
+                direction = (0, 1)
+            if keys[pygame.K_RIGHT] and (-1, 0) != direction:
+                direction = (1, 0)
+        return direction
+
+
+    arena_width = max( 16, min( settings["arena"]["width"], MAX_ARENA_SIZE ) )
+    arena_height = max( 16, min( settings["arena"]["height"], MAX_ARENA_SIZE ) )
+    if not SURFARRAY and ( arena_width * GRID_SIZE > WINDOW_WIDTH or arena_height * GRID_SIZE > WINDOW_HEIGHT ):
+        debugPrint( "numpy is needed for an arena bigger than the window, using the window size", 4 )
+        arena_width = WINDOW_WIDTH // GRID_SIZE
+        arena_height = WINDOW_HEIGHT // GRID_SIZE
+    debugPrint( "arena of %sx%s cells", 2, arena_width, arena_height )
+
+    game = TronGame( arena_width, arena_height, player_count=PLAYER_COUNT )
+    camera = Camera( arena_width, arena_height, WINDOW_WIDTH, WINDOW_HEIGHT, GRID_SIZE )
+    if SURFARRAY:
+        renderer = ViewportRenderer( screen, game.board, camera, COLORS["black"] )
+    else:
+        renderer = TrailRenderer( screen, GRID_SIZE, COLORS["black"] )
+    player_colors = [ (player, COLORS[f"player{i+1}"]) for i, player in enumerate( game.players ) ]
+
+    def startRecording():
+        if not RECORD_REPLAYS:
+            return None
+        path = replayPath( REPLAY_DIRECTORY, strftime( "%Y%m%d-%H%M%S" ) )
+        debugPrint( "recording replay in %s", 2, path )
+        return ReplayWriter( path, game, { f"player{i+1}": settings[f"player{i+1}"] for i in range( PLAYER_COUNT ) } )
+
+    profiler = Profiler()
+    # F2 shows fps, ticks per second, bot decision times and trail lengths
+    text_cache = TextCache( font )
+    performance = PerformanceOverlay( small_font, profiler, COLORS["white"] )
+    player_names = [ settings[f"player{i+1}"]["name"] for i in range( PLAYER_COUNT ) ]
+
+    def dumpProfile( export ):
+        # the report walks every span, only built when it is written
+        if logger.isEnabled( 3 ):
+            debugPrint( "frame timings\n%s", 3, profiler.report() )
+        if export:
+            os.makedirs( PROFILE_DIRECTORY, exist_ok=True )
+            name = os.path.join( PROFILE_DIRECTORY, strftime( "%Y%m%d-%H%M%S" ) )
+            profiler.exportChromeTrace( name + ".json" )
+            profiler.exportPstats( name + ".pstats" )
+            debugPrint( "frame timings exported in %s.json and %s.pstats", 2, name, name )
+
+    recorder = startRecording()
+    bots = {}
+    for i, player in enumerate( game.players ):
+        player_settings = settings[f"player{i+1}"]
+        if not player_settings["bot"]:
+            continue
+        if ASYNC_BOTS:
+            # every bot process already takes a core, its mcts plays the playouts itself
+            bots[i] = BotController( game, i, player_settings["difficulty"], player.scoring, profiler=profiler, reaction_ticks=REACTION_TICKS )
+            bots[i].request()
+        else:
+            player.mcts_workers = MCTS_WORKERS
+
+    for i, ( player, color ) in enumerate( player_colors ):
+        debugPrint( "player %s color %s", 1, i + 1, color )
 
     running = True
     state = "running"
     last_state = state
+    tick_length = 1 / settings["tick_rate"]
+    speed = SPEEDS.index( 1 )
+    max_speed = False
+    # real time owed to the simulation, every tick takes tick_length out of it
+    accumulator = 0.0
+    frame_time = 0.0
 
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    player1.reset()
-                    player2.reset()
-                    state = "running"
-                    debugPrint( "restart game", 1 )
-        
-        if state == "running":
+        # the whole frame without the wait for the next one
+        frame_start = perf_counter()
+        with profiler.span( "events" ):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_r:
+                        game.reset()
+                        renderer.reset()
+                        if recorder is not None:
+                            recorder.close()
+                        recorder = startRecording()
+                        for bot in bots.values():
+                            bot.reset()
+                            bot.request()
+                        state = "running"
+                        accumulator = 0.0
+                        debugPrint( "restart game", 1 )
+                    if event.key == pygame.K_TAB:
+                        camera.cycle( PLAYER_COUNT )
+                    if event.key == pygame.K_LEFTBRACKET:
+                        camera.zoom( -1 )
+                    if event.key == pygame.K_RIGHTBRACKET:
+                        camera.zoom( 1 )
+                    if event.key == pygame.K_F2:
+                        performance.toggle()
+                    if event.key == pygame.K_F3:
+                        dumpProfile( True )
+                    if event.key == pygame.K_MINUS:
+                        speed = max( speed - 1, 0 )
+                        debugPrint( "speed x%s", 2, SPEEDS[speed] )
+                    if event.key == pygame.K_EQUALS:
+                        speed = min( speed + 1, len( SPEEDS ) - 1 )
+                        debugPrint( "speed x%s", 2, SPEEDS[speed] )
+                    if event.key == pygame.K_0:
+                        max_speed = not max_speed
+                        debugPrint( "max speed %s", 2, max_speed )
+
+        # fixed timestep, the frame rate only decides how many ticks run at once
+        # ticks stop when the frame is used up, slow ticks slow the game down but the window stays responsive
+        frame_end = frame_start + 1 / FPS
+        if not max_speed:
+            accumulator = min( accumulator + frame_time * SPEEDS[speed], MAX_TICKS_PER_FRAME * tick_length )
+        frame_ticks = 0
+        while state == "running" and game.result is None and ( max_speed or accumulator >= tick_length ) \
+                and ( frame_ticks == 0 or perf_counter() < frame_end ):
+            # lockstep, the tick waits for the decision of every bot but the frame goes on, the window
+            # keeps drawing and reading the keyboard until the bots answered
+            with profiler.span( "bot wait" ):
+                waiting = [ i for i, bot in bots.items() if not bot.ready() ]
+            if waiting:
+                break
+            accumulator -= tick_length
+            frame_ticks += 1
             debugPrint( "update players", 1 )
-            if not settings["player1"]["bot"]:
-                player1.updatePlayer()
-            else:
-                player1.updateBot( settings["player1"]["difficulty"], player2.getPossibleTrail(), player2.getPos() )
-            if not settings["player2"]["bot"]:
-                player2.updatePlayer()
-            else:
-                player2.updateBot( settings["player2"]["difficulty"], player1.getPossibleTrail(), player1.getPos() )
-            
-            player1.update()
-            player2.update()
+            with profiler.span( "update players" ):
+                actions = []
+                for i, player in enumerate( game.players ):
+                    player_settings = settings[f"player{i+1}"]
+                    if not player_settings["bot"]:
+                        actions.append( updatePlayer( player ) )
+                    elif i in bots:
+                        actions.append( bots[i].action() )
+                    else:
+                        with profiler.span( f"bot{i+1} think" ):
+                            actions.append( game.think( i, player_settings["difficulty"], REACTION_TICKS ) )
             
             debugPrint( "check player lives", 1 )
-            player1.isAlive( player2.getTrail() )
-            player2.isAlive( player1.getTrail() )
+            with profiler.span( "check player lives" ):
+                game.step( actions )
+            with profiler.span( "bot requests" ):
+                for bot in bots.values():
+                    bot.request()
+            if recorder is not None:
+                with profiler.span( "record" ):
+                    recorder.record()
+                    if game.result is not None:
+                        recorder.close()
 
         debugPrint( "check death", 1 )
-        if player1.is_alive == False and player2.is_alive == False:
+        if game.result == 0:
             state = "egality"
-        if player1.is_alive and player2.is_alive == False:
-            state = f"{settings["player1"]["name"]} win"
-        if player1.is_alive == False and player2.is_alive:
-            state = f"{settings["player2"]["name"]} win"
+        if game.result:
+            state = settings[f"player{game.result}"]["name"] + " win"
         
-        debugPrint( "refresh screen", 1 )
-        screen.fill(COLORS["black"])
-        player1.drawTrail()
-        player2.drawTrail()
-
         debugPrint( "print text if end game", 1 )
+        overlay = []
         if state != "running":
-            text1 = font.render( state, True, COLORS["white"] )
-            screen.blit( text1, (WINDOW_WIDTH//2 - text1.get_width()//2, WINDOW_HEIGHT//4) )
-            text2 = font.render( "Press R to restart", True, COLORS["white"] )
-            screen.blit( text2, (WINDOW_WIDTH//2 - text2.get_width()//2, WINDOW_HEIGHT//4+25) )
+            text1 = text_cache.render( state, COLORS["white"] )
+            overlay.append( (text1, (WINDOW_WIDTH//2 - text1.get_width()//2, WINDOW_HEIGHT//4)) )
+            text2 = text_cache.render( "Press R to restart", COLORS["white"] )
+            overlay.append( (text2, (WINDOW_WIDTH//2 - text2.get_width()//2, WINDOW_HEIGHT//4+25)) )
+        stats = performance.update( game, player_names )
+        if stats is not None:
+            overlay.append( stats )
         
         debugPrint( "state debug", 1 )
         if last_state != state:
-            debugPrint( f"state is now at {state}", 2 )
+            debugPrint( "state is now at %s", 2, state )
         last_state = state
 
-        debugPrint( "pygame functionning", 1 )
-        pygame.display.flip()
+        debugPrint( "refresh screen", 1 )
+        with profiler.span( "refresh screen" ):
+            renderer.render( player_colors, ( state, performance.key if performance.visible else None ), overlay )
+        profiler.record( "frame", perf_counter() - frame_start, frame_start )
 
-        clock.tick(FPS)
+        debugPrint( "pygame functionning", 1 )
+        with profiler.span( "pygame functionning" ):
+            frame_time = clock.tick(FPS) / 1000
+    for bot in bots.values():
+        bot.close()
+    if recorder is not None:
+        recorder.close()
+    dumpProfile( False )
+    logger.close()
 except Exception as e:
     tb = traceback.extract_tb(sys.exc_info()[2])
     line = tb[-1].lineno
-    debugPrint( str( e ) + f" line:{line}", 5 )
\ No newline at end of file
+    debugPrint( "%s line:%s", 5, e, line )
+    logger.close()
\ No newline at end of file
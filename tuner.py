@@ -0,0 +1,229 @@
+import argparse
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from time import perf_counter
+
+from engine import TronGame, DEFAULT_PARAMS, PRESETS_FILE
+from headless import playMatch
+from tournament import gameSeed
+
+# self-play tuning of the bot params
+# every generation the candidates and the default params play each other on a process pool, an elo
+# is fitted on all the games played so far and the best candidates are saved as new difficulties
+#   python tron.py --tune --method cem --generations 5 --population 8 --games 20 --save 2
+
+# name -> (low, high, integer)
+PARAM_SPACE = {
+    "aggression": ( 0.0, 1.0, False ),
+    "vision": ( 3, 16, True ),
+    "lookahead_depth": ( 1, 4, True ),
+    "mobility": ( 0.0, 10.0, False )
+}
+GRID_STEPS = 3
+# part of a cem population kept to fit the next sampling distribution
+ELITE = 0.25
+# the first preset written gets the first free difficulty from here (6 is the mcts)
+FIRST_PRESET = 7
+ELO_SCALE = 400 / math.log( 10 )
+
+
+def clamp( name, value ):
+    low, high, integer = PARAM_SPACE[name]
+    value = min( high, max( low, value ) )
+    return round( value ) if integer else round( value, 3 )
+
+
+def randomParams( rng ):
+    return { name: clamp( name, rng.uniform( low, high ) ) for name, ( low, high, _ ) in PARAM_SPACE.items() }
+
+
+def gridParams():
+    axes = []
+    for name, ( low, high, integer ) in PARAM_SPACE.items():
+        values = { clamp( name, low + ( high - low ) * i / ( GRID_STEPS - 1 ) ) for i in range( GRID_STEPS ) }
+        axes.append( sorted( values ) )
+    return [ dict( zip( PARAM_SPACE, values ) ) for values in product( *axes ) ]
+
+
+class CrossEntropy:
+    # a gaussian per param, refitted on the best candidates of every generation
+    # (the diagonal part of cma-es, no covariance between params)
+    def __init__( self, rng ):
+        self.rng = rng
+        self.mean = { name: float( DEFAULT_PARAMS[name] ) for name in PARAM_SPACE }
+        self.sigma = { name: ( high - low ) / 4 for name, ( low, high, _ ) in PARAM_SPACE.items() }
+
+    def sample( self, count ):
+        return [
+            { name: clamp( name, self.rng.gauss( self.mean[name], self.sigma[name] ) ) for name in PARAM_SPACE }
+            for _ in range( count )
+        ]
+
+    def update( self, ranked ):
+        elite = ranked[:max( 2, int( len( ranked ) * ELITE ) )]
+        for name, ( low, high, _ ) in PARAM_SPACE.items():
+            values = [ params[name] for params in elite ]
+            mean = sum( values ) / len( values )
+            variance = sum( ( value - mean ) ** 2 for value in values ) / len( values )
+            self.mean[name] = mean
+            # never collapses completely, a little noise keeps exploring
+            self.sigma[name] = max( math.sqrt( variance ), ( high - low ) / 50 )
+
+
+def playPair( base, params1, params2, seeds ):
+    # [egality, params1 wins, params2 wins] over the seeds, sides are swapped every other game
+    game = TronGame( random_start=True )
+    results = [0, 0, 0]
+    ticks = 0
+    for k, seed in enumerate( seeds ):
+        swap = k % 2
+        game.players[0].params = { **DEFAULT_PARAMS, **( params2 if swap else params1 ) }
+        game.players[1].params = { **DEFAULT_PARAMS, **( params1 if swap else params2 ) }
+        result, match_ticks = playMatch( game, [base, base], seed )
+        if swap and result:
+            result = 3 - result
+        results[result] += 1
+        ticks += match_ticks
+    return results, ticks
+
+
+def playRound( pool, base, candidates, pairs, games, seed ):
+    # scores[(i, j)] = [egality, i wins, j wins] for every pair of candidate indices
+    futures = {}
+    for i, j in pairs:
+        seeds = [ gameSeed( seed, i, j, g ) for g in range( games ) ]
+        futures[pool.submit( playPair, base, candidates[i], candidates[j], seeds )] = (i, j)
+    scores = {}
+    ticks = 0
+    for future in as_completed( futures ):
+        results, pair_ticks = future.result()
+        scores[futures[future]] = results
+        ticks += pair_ticks
+    return scores, ticks
+
+
+def fitElo( count, scores, anchor=0, iterations=200 ):
+    # bradley-terry fit (a draw is half a win), the anchor stays at 0
+    # returns the ratings and their 95% interval half width from the fisher information
+    ratings = [0.0] * count
+    for _ in range( iterations ):
+        gradient = [0.0] * count
+        information = [0.0] * count
+        for ( i, j ), ( draws, wins, losses ) in scores.items():
+            games = draws + wins + losses
+            if not games:
+                continue
+            expected = 1 / ( 1 + math.exp( ratings[j] - ratings[i] ) )
+            score = wins + draws / 2
+            gradient[i] += score - games * expected
+            gradient[j] -= score - games * expected
+            information[i] += games * expected * ( 1 - expected )
+            information[j] += games * expected * ( 1 - expected )
+        for k in range( count ):
+            if k != anchor and information[k] > 0:
+                # damped newton step, unbeaten candidates would run away otherwise
+                ratings[k] += max( -1.0, min( 1.0, gradient[k] / information[k] ) )
+    intervals = [
+        1.96 * ELO_SCALE / math.sqrt( info ) if info > 0 else math.inf
+        for info in information
+    ]
+    return [ rating * ELO_SCALE for rating in ratings ], intervals
+
+
+def savePresets( path, base, ranked, count ):
+    presets = {}
+    if os.path.exists( path ):
+        with open( path ) as f:
+            presets = json.load( f )
+    difficulty = FIRST_PRESET
+    saved = []
+    for params, elo, interval in ranked[:count]:
+        while str( difficulty ) in presets:
+            difficulty += 1
+        presets[str( difficulty )] = {
+            "base": base,
+            "params": params,
+            "elo": round( elo, 1 ),
+            "interval": round( interval, 1 )
+        }
+        saved.append( difficulty )
+    with open( path, "w" ) as f:
+        json.dump( presets, f, indent=4 )
+    return saved
+
+
+def tune( method, generations, population, games, base=3, seed=0, workers=None, on_generation=None ):
+    # returns [(params, elo, interval)] best first, the default params are candidate 0 and rated 0
+    rng = random.Random( seed )
+    candidates = [ { name: DEFAULT_PARAMS[name] for name in PARAM_SPACE } ]
+    scores = {}
+    sampler = CrossEntropy( rng ) if method == "cem" else None
+    grid = gridParams() if method == "grid" else None
+    ranked = []
+    leaders = []
+
+    with ProcessPoolExecutor( max_workers=workers ) as pool:
+        for generation in range( generations ):
+            start = perf_counter()
+            if sampler is not None:
+                new = sampler.sample( population )
+            elif grid is not None:
+                new = grid[generation * population:( generation + 1 ) * population]
+            else:
+                new = [ randomParams( rng ) for _ in range( population ) ]
+            if not new:
+                break
+            first = len( candidates )
+            candidates.extend( new )
+            # newcomers play the default params, each other and the current best few
+            pairs = set()
+            for i in range( first, len( candidates ) ):
+                for j in { 0, *leaders } | set( range( first, i ) ):
+                    pairs.add( (j, i) )
+            round_scores, ticks = playRound( pool, base, candidates, sorted( pairs ), games, seed + generation )
+            scores.update( round_scores )
+
+            ratings, intervals = fitElo( len( candidates ), scores )
+            order = sorted( range( len( candidates ) ), key=lambda k: -ratings[k] )
+            ranked = [ ( candidates[k], ratings[k], intervals[k] ) for k in order ]
+            leaders = order[:3]
+            if sampler is not None:
+                sampler.update( [ candidates[k] for k in order if k >= first ] )
+            if on_generation is not None:
+                on_generation( generation, ranked, ticks, perf_counter() - start )
+    return ranked
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( prog="tron.py --tune", description="self-play search of the bot params" )
+    parser.add_argument( "--tune", action="store_true" )
+    parser.add_argument( "--method", choices=( "grid", "random", "cem" ), default="cem" )
+    parser.add_argument( "--generations", type=int, default=5 )
+    parser.add_argument( "--population", type=int, default=8, help="new candidates per generation" )
+    parser.add_argument( "--games", type=int, default=20, help="games per pair of candidates" )
+    parser.add_argument( "--base", type=int, default=3, help="difficulty the params are tuned for" )
+    parser.add_argument( "--workers", type=int, default=None, help="defaults to the number of cores" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--save", type=int, default=0, metavar="N", help="save the N best candidates as difficulties" )
+    parser.add_argument( "--presets", default=PRESETS_FILE )
+    args = parser.parse_args( argv )
+
+    def progress( generation, ranked, ticks, elapsed ):
+        print( f"generation {generation + 1}: {ticks / max( elapsed, 1e-9 ):.0f} ticks/sec" )
+        for params, elo, interval in ranked[:5]:
+            print( f"  {elo:+7.1f} +/- {interval:5.1f}  {params}" )
+
+    ranked = tune( args.method, args.generations, args.population, args.games, args.base, args.seed, args.workers, progress )
+    if args.save:
+        # the default params are never saved again
+        ranked = [ entry for entry in ranked if entry[0] != { name: DEFAULT_PARAMS[name] for name in PARAM_SPACE } ]
+        saved = savePresets( args.presets, args.base, ranked, args.save )
+        print( f"saved as difficulties {', '.join( map( str, saved ) )} in {args.presets}" )
+
+
+if __name__ == "__main__":
+    main()